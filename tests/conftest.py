@@ -33,6 +33,17 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def temp_media_root(settings, tmp_path):
+    # mixer и загрузки сохраняют картинки во временный каталог, копии
+    # строятся в запросе: пул процессов не видит тестовую базу.
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.RENDITION_WORKERS = 0
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
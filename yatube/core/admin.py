@@ -0,0 +1,19 @@
+"""The admin site configuration"""
+
+from django.contrib import admin
+
+from .models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created', 'duration', 'view', 'template', 'sql')
+    list_filter = ('view',)
+    search_fields = ('sql', 'template')
+    readonly_fields = ('created', 'duration', 'view', 'template', 'sql',
+                       'params', 'stack')
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,81 @@
+"""Core view decorators"""
+
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.utils.translation import get_language
+
+ANONYMOUS_PAGE_KEY = 'anonymous_page:{}:{}:{}'
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def cache_anonymous(version, timeout: int):
+    """Кэширует целиком ответы на GET/HEAD анонимных посетителей.
+
+    Ключ строится из пути с query string, языка и ``version()`` —
+    поколения контента, которое сдвигают сигналы моделей. Запросы
+    авторизованных пользователей и любые POST идут мимо кэша, ответы
+    с cookie и не-200 не сохраняются. Сохранённые ETag и Last-Modified
+    отдаются вместе со страницей, так что 304 возможен и без view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            key = ANONYMOUS_PAGE_KEY.format(
+                version(),
+                get_language(),
+                hashlib.md5(request.get_full_path().encode()).hexdigest()
+            )
+            cached = cache.get(key)
+            if cached is not None:
+                content, headers = cached
+                response = HttpResponse(content)
+                for header, value in headers.items():
+                    response[header] = value
+                return get_conditional_response(
+                    request,
+                    etag=headers.get('ETag'),
+                    last_modified=parse_http_date_safe(
+                        headers.get('Last-Modified', '')),
+                    response=response
+                )
+            response = view(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies):
+                headers = {
+                    header: response[header]
+                    for header in CACHED_HEADERS if response.has_header(header)
+                }
+                cache.set(key, (response.content, headers), timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def query_budget(queries: int):
+    """Объявляет предел SQL-запросов на один запрос к view.
+
+    Предел читают QueryBudgetMiddleware и тесты бюджетов. Считаются все
+    запросы обработки, включая сессию и пользователя. Декоратор ставится
+    первым: ``wraps`` остальных декораторов переносит атрибут наружу.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def get_query_budget(view):
+    """Предел view-функции или класса из ``as_view()``; None — не задан."""
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view, 'view_class', None), 'query_budget',
+                         None)
+    return budget
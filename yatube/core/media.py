@@ -0,0 +1,45 @@
+"""Core media serving configuration"""
+
+import mimetypes
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.views.static import serve
+
+DJANGO = 'django'
+X_ACCEL = 'x-accel'
+X_SENDFILE = 'x-sendfile'
+
+
+def sendfile(request, storage, name: str) -> HttpResponse:
+    """Отдаёт файл хранилища, перекладывая передачу байтов на фронтенд.
+
+    ``MEDIA_SERVE_MODE`` выбирает способ: ``x-accel`` — заголовок
+    X-Accel-Redirect на внутренний location nginx из
+    ``MEDIA_ACCEL_PREFIX``, ``x-sendfile`` — абсолютный путь для
+    Apache/lighttpd, ``django`` — чтение файла самим Django (только для
+    разработки).
+    """
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', DJANGO)
+    if mode == DJANGO:
+        return serve(request, name, document_root=storage.location)
+    content_type, encoding = mimetypes.guess_type(name)
+    response = HttpResponse(
+        content_type=content_type or 'application/octet-stream'
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if mode == X_ACCEL:
+        response['X-Accel-Redirect'] = (
+            getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+            + quote(name)
+        )
+    elif mode == X_SENDFILE:
+        response['X-Sendfile'] = storage.path(name)
+    else:
+        raise ImproperlyConfigured(
+            f'Неизвестный MEDIA_SERVE_MODE: {mode!r}'
+        )
+    return response
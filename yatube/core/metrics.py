@@ -0,0 +1,218 @@
+"""Core metrics configuration
+
+Реестр метрик запросов в текстовом формате Prometheus. Без
+``METRICS_DIR`` значения живут в памяти процесса. С ним каждый процесс
+пишет свои значения в собственный файл, отображённый в память (mmap),
+а ``/metrics`` суммирует файлы всех процессов — так метрики собираются
+со всех воркеров, а не с того, кому достался запрос.
+"""
+
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+DURATION = 'yatube_request_duration_seconds'
+REQUESTS = 'yatube_requests_total'
+QUERIES = 'yatube_db_queries_total'
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+
+HELP = {
+    DURATION: ('histogram', 'Время обработки запроса по имени URL.'),
+    REQUESTS: ('counter', 'Ответы по имени URL и коду статуса.'),
+    QUERIES: ('counter', 'SQL-запросы по имени URL.'),
+}
+
+FILE_PATTERN = 'metrics_{}.db'
+INITIAL_SIZE = 1024 * 1024
+
+
+class MemoryStore:
+    """Значения одного процесса в словаре."""
+
+    def __init__(self):
+        self.values = defaultdict(float)
+
+    def inc(self, key: str, amount: float) -> None:
+        self.values[key] += amount
+
+    def items(self):
+        return self.values.items()
+
+
+class MmapStore:
+    """Значения одного процесса в файле, отображённом в память.
+
+    Формат: 8 байт занятой длины, затем записи ``<uint32 длина ключа>
+    <ключ, выровненный до 8 байт><float64 значение>``. Пишет только
+    процесс-владелец, читать файл могут все.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.positions = {}
+        if not os.path.exists(path):
+            with open(path, 'wb') as file:
+                file.truncate(INITIAL_SIZE)
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = struct.unpack_from('Q', self.map, 0)[0] or 8
+        for key, value, position in read_entries(self.map, self.used):
+            self.positions[key] = position
+
+    def inc(self, key: str, amount: float) -> None:
+        position = self.positions.get(key)
+        if position is None:
+            position = self.append(key)
+        value = struct.unpack_from('d', self.map, position)[0]
+        struct.pack_into('d', self.map, position, value + amount)
+
+    def append(self, key: str) -> int:
+        encoded = key.encode()
+        padded = len(encoded) + (-(4 + len(encoded)) % 8)
+        size = 4 + padded + 8
+        if self.used + size > len(self.map):
+            length = max(len(self.map) * 2, self.used + size)
+            self.map.close()
+            self.file.truncate(length)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        struct.pack_into(f'I{padded}sd', self.map, self.used,
+                         len(encoded), encoded, 0.0)
+        position = self.used + 4 + padded
+        self.used += size
+        struct.pack_into('Q', self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def items(self):
+        return ((key, value) for key, value, _ in
+                read_entries(self.map, self.used))
+
+
+def read_entries(buffer, used: int):
+    """Записи файла метрик: (ключ, значение, смещение значения)."""
+    position = 8
+    while position < used:
+        length = struct.unpack_from('I', buffer, position)[0]
+        padded = length + (-(4 + length) % 8)
+        key = bytes(buffer[position + 4:position + 4 + length]).decode()
+        value_position = position + 4 + padded
+        value = struct.unpack_from('d', buffer, value_position)[0]
+        yield key, value, value_position
+        position = value_position + 8
+
+
+_lock = threading.Lock()
+_stores = {}
+
+
+def get_store():
+    """Хранилище текущего процесса; после fork заводится новое."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    marker = (os.getpid(), directory)
+    store = _stores.get(marker)
+    if store is None:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            store = MmapStore(os.path.join(
+                directory, FILE_PATTERN.format(os.getpid())
+            ))
+        else:
+            store = MemoryStore()
+        _stores[marker] = store
+    return store
+
+
+def make_key(name: str, **labels) -> str:
+    return json.dumps([name, sorted(labels.items())])
+
+
+def observe_request(view: str, status: int, seconds: float,
+                    queries: int) -> None:
+    """Учитывает один запрос: гистограмму времени, статус и SQL."""
+    with _lock:
+        store = get_store()
+        for bound in BUCKETS:
+            if seconds <= bound:
+                store.inc(make_key(f'{DURATION}_bucket', view=view,
+                                   le=format_bound(bound)), 1)
+                break
+        store.inc(make_key(f'{DURATION}_sum', view=view), seconds)
+        store.inc(make_key(f'{DURATION}_count', view=view), 1)
+        store.inc(make_key(REQUESTS, view=view, status=str(status)), 1)
+        store.inc(make_key(QUERIES, view=view), queries)
+
+
+def format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def collect() -> dict:
+    """Сумма значений по всем процессам: {ключ: значение}."""
+    totals = defaultdict(float)
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        with _lock:
+            for key, value in get_store().items():
+                totals[key] += value
+        return totals
+    for path in glob.glob(os.path.join(directory, FILE_PATTERN.format('*'))):
+        # Файл только что созданного процесса может быть ещё пустым.
+        if os.path.getsize(path) < INITIAL_SIZE:
+            continue
+        with open(path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0,
+                           access=mmap.ACCESS_READ) as buffer:
+                used = struct.unpack_from('Q', buffer, 0)[0]
+                for key, value, _ in read_entries(buffer, used):
+                    totals[key] += value
+    return totals
+
+
+def escape(value: str) -> str:
+    return (value.replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def render() -> str:
+    """Метрики в текстовом формате Prometheus 0.0.4."""
+    samples = defaultdict(dict)
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples[name][tuple(tuple(label) for label in labels)] = value
+    # Бакеты хранятся по отдельности, а отдаются накопительно.
+    buckets = samples.pop(f'{DURATION}_bucket', {})
+    cumulative = {}
+    views = {dict(labels)['view']
+             for labels in samples.get(f'{DURATION}_count', {})}
+    for view in sorted(views):
+        total = 0
+        for bound in BUCKETS:
+            le = format_bound(bound)
+            total += buckets.get((('le', le), ('view', view)), 0)
+            cumulative[(('le', le), ('view', view))] = total
+    samples[f'{DURATION}_bucket'] = cumulative
+    lines = []
+    for metric, (kind, text) in HELP.items():
+        lines.append(f'# HELP {metric} {text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        names = ([f'{metric}_bucket', f'{metric}_sum', f'{metric}_count']
+                 if kind == 'histogram' else [metric])
+        for name in names:
+            items = samples.get(name, {}).items()
+            if name != f'{DURATION}_bucket':
+                items = sorted(items)
+            for labels, value in items:
+                label_text = ','.join(
+                    f'{label}="{escape(str(label_value))}"'
+                    for label, label_value in labels
+                )
+                lines.append(f'{name}{{{label_text}}} {value!r}')
+    return '\n'.join(lines) + '\n'
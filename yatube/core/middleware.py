@@ -0,0 +1,274 @@
+"""Core middleware configuration"""
+
+import json
+import logging
+import threading
+from contextlib import ExitStack
+from functools import wraps
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import reverse
+from django.template.backends.django import Template
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .decorators import get_query_budget
+from .profiling import profile_request
+from .slow_queries import SlowQueryRecorder
+
+logger = logging.getLogger('core.timing')
+budget_logger = logging.getLogger('core.query_budget')
+
+_local = threading.local()
+_MISSING = object()
+
+
+class RequestTimings:
+    """Счётчики одного запроса: SQL, шаблоны и обращения к кэшу."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total = 0.0
+        self.rendering = False
+        self.in_get_many = False
+
+    def execute(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += perf_counter() - start
+            self.queries += 1
+
+    def header(self) -> str:
+        return ', '.join((
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hit, {self.cache_misses} miss"',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def as_dict(self) -> dict:
+        return {
+            'total_ms': round(self.total * 1000, 1),
+            'db_queries': self.queries,
+            'db_ms': round(self.db * 1000, 1),
+            'template_ms': round(self.template * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def current_timings():
+    """Счётчики текущего запроса или None вне ServerTimingMiddleware."""
+    return getattr(_local, 'timings', None)
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        timings = current_timings()
+        # Вложенные render_to_string уже входят во время внешнего шаблона.
+        if timings is None or timings.rendering:
+            return render(self, *args, **kwargs)
+        timings.rendering = True
+        start = perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.template += perf_counter() - start
+            timings.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+def _counted_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        timings = current_timings()
+        if timings is None or timings.in_get_many:
+            return get(self, key, default, version)
+        value = get(self, key, _MISSING, version)
+        if value is _MISSING:
+            timings.cache_misses += 1
+            return default
+        timings.cache_hits += 1
+        return value
+    wrapper.timed = True
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        timings = current_timings()
+        if timings is None or timings.in_get_many:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        timings.in_get_many = True
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            timings.in_get_many = False
+        timings.cache_hits += len(found)
+        timings.cache_misses += len(keys) - len(found)
+        return found
+    wrapper.timed = True
+    return wrapper
+
+
+def instrument():
+    """Один раз оборачивает рендер шаблонов и чтение из кэшей проекта."""
+    if not getattr(Template.render, 'timed', False):
+        Template.render = _timed_render(Template.render)
+    for config in settings.CACHES.values():
+        backend = import_string(config['BACKEND'])
+        if not getattr(backend.get, 'timed', False):
+            backend.get = _counted_get(backend.get)
+        if not getattr(backend.get_many, 'timed', False):
+            backend.get_many = _counted_get_many(backend.get_many)
+
+
+class ServerTimingMiddleware:
+    """Замеряет запрос и отдаёт итог в Server-Timing и в лог ``core.timing``.
+
+    Те же замеры попадают в реестр ``core.metrics`` для ``/metrics``.
+
+    Заголовок видят персонал и режим DEBUG (или все при
+    ``SERVER_TIMING_PUBLIC``): по нему можно подбирать запросы к базе.
+    Строка лога пишется для каждого запроса в виде JSON.
+    Middleware ставится первым, чтобы в total попало всё остальное.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument()
+
+    def __call__(self, request):
+        timings = _local.timings = RequestTimings()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timings.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+        timings.total = perf_counter() - start
+        if self.show_header(request):
+            response['Server-Timing'] = timings.header()
+        match = request.resolver_match
+        metrics.observe_request(
+            match.view_name if match else 'unmatched',
+            response.status_code, timings.total, timings.queries
+        )
+        logger.info(json.dumps(dict(
+            method=request.method,
+            path=request.path,
+            view=match.view_name if match else None,
+            status=response.status_code,
+            user=getattr(getattr(request, 'user', None), 'pk', None),
+            **timings.as_dict()
+        )))
+        return response
+
+    @staticmethod
+    def show_header(request) -> bool:
+        if settings.DEBUG or getattr(settings, 'SERVER_TIMING_PUBLIC', False):
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+
+class SlowQueryMiddleware:
+    """Журнал SQL дольше ``SLOW_QUERY_THRESHOLD_MS`` (по умолчанию выключен).
+
+    Каждый медленный запрос сохраняется с view, узлом шаблона и кадрами
+    кода проекта, откуда он пришёл; смотреть журнал — в админке.
+    """
+
+    def __init__(self, get_response):
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', None)
+        if self.threshold is None:
+            raise MiddlewareNotUsed
+        self.size = getattr(settings, 'SLOW_QUERY_LOG_SIZE', 500)
+        self.log_params = getattr(settings, 'SLOW_QUERY_LOG_PARAMS', False)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(request, self.threshold, self.size,
+                                     self.log_params)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """Профиль запроса по требованию персонала.
+
+    Включается параметром ``?_profile=1`` или заголовком ``X-Profile: 1``;
+    без них стоит две проверки словаря. Ответ получает ``X-Profile-Id`` и
+    ссылку ``X-Profile-Url`` на дерево вызовов; рядом лежат ``.prof`` для
+    pstats/snakeviz и ``.collapsed`` для flamegraph.
+    Ставится после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (request.GET.get('_profile') or request.META.get(
+                'HTTP_X_PROFILE')) or not request.user.is_staff:
+            return self.get_response(request)
+        response, profile_id = profile_request(self.get_response, request)
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Url'] = reverse('profile_download',
+                                            args=[f'{profile_id}.txt'])
+        return response
+
+
+class QueryBudgetExceeded(Exception):
+    """View выполнил больше SQL-запросов, чем объявил в query_budget."""
+
+
+class QueryBudgetMiddleware:
+    """Сверяет число SQL-запросов с бюджетом view (для стейджинга).
+
+    ``QUERY_BUDGET_MODE``: ``'log'`` — предупреждение в лог
+    ``core.query_budget``, ``'raise'`` — исключение QueryBudgetExceeded;
+    без настройки middleware отключается.
+    """
+
+    def __init__(self, get_response):
+        self.mode = getattr(settings, 'QUERY_BUDGET_MODE', None)
+        if self.mode not in ('log', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(timings.execute)
+                )
+            response = self.get_response(request)
+        match = request.resolver_match
+        budget = get_query_budget(match.func) if match else None
+        if budget is not None and timings.queries > budget:
+            message = (f'{match.view_name}: {timings.queries} SQL-запросов '
+                       f'при бюджете {budget} ({request.get_full_path()})')
+            if self.mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            budget_logger.warning(message)
+        return response
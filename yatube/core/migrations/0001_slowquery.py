@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('duration', models.FloatField(verbose_name='Длительность, мс')),
+                ('sql', models.TextField(verbose_name='SQL')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='View')),
+                ('template', models.CharField(blank=True, help_text='Файл, строка и тег шаблона, вызвавшие запрос', max_length=500, verbose_name='Шаблон')),
+                ('stack', models.TextField(blank=True, help_text='Кадры кода проекта, от внешнего к внутреннему', verbose_name='Стек')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-pk',),
+            },
+        ),
+    ]
@@ -16,3 +16,35 @@ class CreatedModel(models.Model):
     class Meta:
         abstract = True
         ordering = ('-created',)
+
+
+class SlowQuery(models.Model):
+    """Медленный SQL-запрос с местом в коде и шаблоне, откуда он пришёл.
+
+    Таблица — кольцевой буфер: при записи старые строки сверх
+    ``SLOW_QUERY_LOG_SIZE`` удаляются.
+    """
+    created = models.DateTimeField(_('Дата'), auto_now_add=True)
+    duration = models.FloatField(_('Длительность, мс'))
+    sql = models.TextField(_('SQL'))
+    params = models.TextField(_('Параметры'), blank=True)
+    view = models.CharField(_('View'), max_length=200, blank=True)
+    template = models.CharField(
+        _('Шаблон'),
+        max_length=500,
+        blank=True,
+        help_text=_('Файл, строка и тег шаблона, вызвавшие запрос')
+    )
+    stack = models.TextField(
+        _('Стек'),
+        blank=True,
+        help_text=_('Кадры кода проекта, от внешнего к внутреннему')
+    )
+
+    class Meta:
+        verbose_name = _('Медленный запрос')
+        verbose_name_plural = _('Медленные запросы')
+        ordering = ('-pk',)
+
+    def __str__(self):
+        return '{:.0f} мс: {:.60}'.format(self.duration, self.sql)
@@ -0,0 +1,105 @@
+"""Core request profiler configuration"""
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+EXTENSIONS = ('prof', 'txt', 'collapsed')
+SAMPLE_INTERVAL = 0.001
+
+
+class StackSampler(threading.Thread):
+    """Снимает стек потока запроса раз в ``SAMPLE_INTERVAL`` секунд.
+
+    Результат — счётчик стеков в свёрнутом виде ``a;b;c``, который
+    понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id: int):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append('{}:{}'.format(
+                    os.path.basename(code.co_filename), code.co_name
+                ))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.most_common())
+
+
+def profile_request(get_response, request):
+    """Выполняет запрос под cProfile и сэмплером, сохраняет результаты.
+
+    Возвращает ответ и идентификатор профиля для скачивания.
+    """
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+        sampler.stopped.set()
+        sampler.join()
+    return response, save(profiler, sampler, request)
+
+
+def get_directory() -> str:
+    return getattr(settings, 'PROFILE_DIR', os.path.join(
+        tempfile.gettempdir(), 'yatube-profiles'
+    ))
+
+
+def save(profiler, sampler, request) -> str:
+    directory = get_directory()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = '{}-{}'.format(time.strftime('%Y%m%d%H%M%S'),
+                                uuid.uuid4().hex[:8])
+    path = os.path.join(directory, profile_id)
+    profiler.dump_stats(f'{path}.prof')
+    text = io.StringIO()
+    text.write(f'{request.method} {request.get_full_path()}\n\n')
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats('cumulative').print_stats(40)
+    stats.print_callees(20)
+    with open(f'{path}.txt', 'w') as file:
+        file.write(text.getvalue())
+    with open(f'{path}.collapsed', 'w') as file:
+        file.write(sampler.collapsed())
+    prune(directory, getattr(settings, 'PROFILE_KEEP', 50))
+    return profile_id
+
+
+def prune(directory: str, keep: int) -> None:
+    """Оставляет ``keep`` последних профилей."""
+    profiles = sorted(glob.glob(os.path.join(directory, '*.prof')))
+    for path in profiles[:-keep]:
+        stem = path[:-len('.prof')]
+        for extension in EXTENSIONS:
+            try:
+                os.remove(f'{stem}.{extension}')
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,110 @@
+"""Core slow query log configuration"""
+
+import logging
+import os
+import sys
+import threading
+from time import perf_counter
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.template.base import Node, TokenType
+
+logger = logging.getLogger('core.slow_sql')
+
+_local = threading.local()
+RENDER_CODE = Node.render_annotated.__code__
+
+
+def template_frame(frame) -> str:
+    """Самый глубокий узел шаблона на стеке: ``файл:строка {{ … }}``."""
+    while frame is not None:
+        if frame.f_code is RENDER_CODE:
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                tag = ('{{ %s }}' if token.token_type == TokenType.VAR
+                       else '{%% %s %%}') % token.contents
+                return f'{origin.template_name}:{token.lineno} {tag}'
+        frame = frame.f_back
+    return ''
+
+
+def project_stack(frame, limit: int = 8) -> str:
+    """Кадры кода проекта (без Django и библиотек) от внешнего к вызову."""
+    root = str(settings.BASE_DIR)
+    frames = []
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(root) and 'site-packages' not in filename
+                and filename != __file__):
+            frames.append('{}:{} in {}'.format(
+                os.path.relpath(filename, root), frame.f_lineno,
+                frame.f_code.co_name
+            ))
+        frame = frame.f_back
+    return '\n'.join(reversed(frames))
+
+
+def redact_params(params) -> str:
+    """Типы параметров вместо значений: ``(int, str)``."""
+    if not params:
+        return ''
+    if isinstance(params, dict):
+        return '{%s}' % ', '.join(f'{key!r}: {type(value).__name__}'
+                                  for key, value in params.items())
+    return '(%s)' % ', '.join(type(value).__name__ for value in params)
+
+
+class SlowQueryRecorder:
+    """Обёртка ``connection.execute_wrapper``: пишет запросы дольше порога.
+
+    Запись идёт в модель ``SlowQuery`` и в лог ``core.slow_sql``; свои
+    INSERT и DELETE рекордер не замеряет. Значения параметров (хеши
+    паролей, ключи сессий, токены) пишутся только при ``log_params``,
+    иначе — лишь их типы.
+    """
+
+    def __init__(self, request, threshold_ms: float, size: int,
+                 log_params: bool = False):
+        self.request = request
+        self.threshold = threshold_ms / 1000
+        self.size = size
+        self.log_params = log_params
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'recording', False):
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        result = execute(sql, params, many, context)
+        duration = perf_counter() - start
+        if duration >= self.threshold:
+            self.record(sql, params, duration, sys._getframe(1))
+        return result
+
+    def record(self, sql, params, duration, frame):
+        from .models import SlowQuery
+
+        entry = SlowQuery(
+            duration=round(duration * 1000, 2),
+            sql=sql,
+            params=(repr(params) if self.log_params
+                    else redact_params(params))[:2000],
+            view=getattr(self.request.resolver_match, 'view_name', ''),
+            template=template_frame(frame)[:500],
+            stack=project_stack(frame),
+        )
+        logger.warning('%.1f ms %s %s | %s | %s', entry.duration,
+                       entry.view, entry.template, entry.sql, entry.params)
+        _local.recording = True
+        try:
+            with transaction.atomic():
+                entry.save()
+                SlowQuery.objects.filter(
+                    pk__lte=entry.pk - self.size
+                ).delete()
+        except DatabaseError:
+            logger.exception('Не удалось сохранить медленный запрос')
+        finally:
+            _local.recording = False
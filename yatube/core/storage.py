@@ -0,0 +1,60 @@
+"""Core storage configuration"""
+
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файл под SHA-256 его содержимого: ``<каталог>/ab/abcd….ext``.
+
+    Дайджест считается по ходу записи во временный файл, поэтому загрузка
+    читается один раз. Если файл с таким содержимым уже есть, временный
+    удаляется и возвращается имя существующего: повторные загрузки не
+    занимают места. Сама запись файлы не удаляет: ссылку на существующий
+    файл можно записать в любой момент, поэтому уборка остаётся чистке
+    сирот, которую бережёт обновлённое время изменения.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Итоговое имя выбирает _save по содержимому; совпадение имён —
+        # это и есть дедупликация, а не конфликт.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(dir=full_directory,
+                                             prefix='.upload-')
+        try:
+            with os.fdopen(handle, 'wb') as destination:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    destination.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2],
+                                  hexdigest + extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.remove(temporary)
+                # Свежее время изменения уберегает файл от чистки сирот,
+                # пока строка со ссылкой на него ещё не записана.
+                os.utime(full_path)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            file_move_safe(temporary, full_path, allow_overwrite=True)
+            os.chmod(full_path, self.file_permissions_mode or 0o644)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
@@ -8,3 +8,10 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.filter
+def srcset(renditions):
+    return ', '.join(
+        f'{rendition.file.url} {rendition.width}w' for rendition in renditions
+    )
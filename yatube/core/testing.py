@@ -0,0 +1,29 @@
+"""Core testing helpers"""
+
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .decorators import get_query_budget
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета SQL из ``@query_budget`` для TestCase."""
+
+    def assertWithinBudget(self, client, url: str, method: str = 'get',
+                           data=None, **extra):
+        """Выполняет запрос и сверяет число SQL с бюджетом его view."""
+        budget = get_query_budget(resolve(urlsplit(url).path).func)
+        self.assertIsNotNone(budget, f'{url}: у view нет @query_budget')
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(url, data or {}, **extra)
+        self.assertLessEqual(
+            len(context), budget,
+            '{}: {} SQL-запросов при бюджете {}:\n{}'.format(
+                url, len(context), budget,
+                '\n'.join(query['sql'] for query in context.captured_queries)
+            )
+        )
+        return response
@@ -1,7 +1,23 @@
 # cores/tests.py
 
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from about.views import AboutAuthorView
+
+from .metrics import FILE_PATTERN, REQUESTS, MmapStore, make_key
+from .middleware import QueryBudgetExceeded
+from .models import SlowQuery
+
+User = get_user_model()
 
 NONEXISTENT_URL = '/nonexistent_page/'
 
@@ -12,3 +28,215 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ServerTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def test_staff_sees_server_timing(self):
+        """Персонал получает Server-Timing, каждый запрос пишется в лог."""
+        self.client.force_login(self.staff)
+        url = reverse('posts:profile', args=[self.user.username])
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            response = self.client.get(url)
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, header)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'posts:profile')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_hits'] + record['cache_misses'], 0)
+
+    def test_header_hidden_from_visitors(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_metrics_aggregate_processes(self):
+        """/metrics суммирует файлы всех процессов из METRICS_DIR."""
+        with self.settings(METRICS_DIR=self.directory, METRICS_TOKEN='t'):
+            for _ in range(2):
+                self.client.get(reverse('posts:index'))
+            other = MmapStore(os.path.join(
+                self.directory, FILE_PATTERN.format('other')
+            ))
+            other.inc(make_key(REQUESTS, view='posts:index', status='200'),
+                      5)
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer t')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{status="200",view="posts:index"} 7.0',
+            text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{le="+Inf",view="posts:index"} 2',
+            text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2.0',
+            text
+        )
+
+    def test_metrics_protected(self):
+        with self.settings(METRICS_DIR=self.directory, METRICS_TOKEN='t'):
+            url = reverse('metrics')
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(
+                self.client.get(url, HTTP_AUTHORIZATION='Bearer x')
+                .status_code,
+                403
+            )
+            self.client.force_login(self.staff)
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SlowQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slow_queries_recorded_with_origin(self):
+        """Медленные запросы пишутся с view, шаблоном и стеком."""
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_SIZE=50):
+            client = Client()
+            client.force_login(self.user)
+            with self.assertLogs('core.slow_sql', 'WARNING'):
+                client.get(reverse('posts:post_create'))
+        # Список групп для выбора в форме запрашивается при рендере поля.
+        entry = SlowQuery.objects.get(view='posts:post_create',
+                                      sql__contains='posts_group')
+        self.assertTrue(entry.template.startswith('posts/create_post.html:'))
+        self.assertIn('addclass', entry.template)
+        self.assertIn('core/templatetags/user_filters.py', entry.stack)
+
+    def test_slow_query_params_redacted(self):
+        """Значения параметров пишутся только по явной настройке."""
+        username = User.objects.create_user(username='secret-name').username
+        url = reverse('posts:profile', args=[username])
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0):
+            with self.assertLogs('core.slow_sql', 'WARNING') as logs:
+                Client().get(url)
+        entries = SlowQuery.objects.filter(sql__contains='"username" =')
+        self.assertTrue(entries.exists())
+        for entry in entries:
+            self.assertEqual(entry.params, '(str)')
+        self.assertNotIn(username, '\n'.join(logs.output))
+        SlowQuery.objects.all().delete()
+        cache.clear()
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0,
+                           SLOW_QUERY_LOG_PARAMS=True):
+            with self.assertLogs('core.slow_sql', 'WARNING'):
+                Client().get(url)
+        entry = SlowQuery.objects.filter(sql__contains='"username" =').first()
+        self.assertIn(username, entry.params)
+
+    def test_slow_query_log_is_bounded(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_SIZE=3):
+            with self.assertLogs('core.slow_sql', 'WARNING'):
+                Client().get(reverse('posts:index'))
+        self.assertLessEqual(SlowQuery.objects.count(), 3)
+
+    def test_disabled_by_default(self):
+        Client().get(reverse('posts:index'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class ProfilerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = self.settings(PROFILE_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_staff_profiles_request(self):
+        """Персонал получает профиль запроса и может его скачать."""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'),
+                                   HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+        text = self.client.get(response['X-Profile-Url'])
+        content = b''.join(text.streaming_content).decode()
+        self.assertIn('cumulative', content)
+        collapsed = self.client.get(
+            reverse('profile_download', args=[f'{profile_id}.collapsed'])
+        )
+        content = b''.join(collapsed.streaming_content).decode()
+        for line in content.splitlines():
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(count.isdigit())
+        prof = self.client.get(
+            reverse('profile_download', args=[f'{profile_id}.prof'])
+        )
+        self.assertEqual(prof.status_code, 200)
+
+    def test_profile_flag_ignored_for_visitors(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(
+            self.client.get(
+                reverse('profile_download', args=['x.prof'])
+            ).status_code,
+            302
+        )
+
+
+@mock.patch.object(AboutAuthorView, 'query_budget', 1)
+class QueryBudgetMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        self.url = reverse('about:author')
+
+    def test_log_mode(self):
+        """Сессия и пользователь не укладываются в бюджет в 1 запрос."""
+        with self.settings(QUERY_BUDGET_MODE='log'):
+            client = Client()
+            client.force_login(self.user)
+            with self.assertLogs('core.query_budget', 'WARNING') as logs:
+                response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('about:author: 2', logs.output[0])
+
+    def test_raise_mode(self):
+        with self.settings(QUERY_BUDGET_MODE='raise'):
+            client = Client()
+            client.force_login(self.user)
+            with self.assertRaises(QueryBudgetExceeded):
+                client.get(self.url)
+            self.assertEqual(Client().get(self.url).status_code, 200)
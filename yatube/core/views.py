@@ -1,7 +1,18 @@
 # core/views.py
 
+import hmac
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics as registry
+from .profiling import EXTENSIONS, get_directory
+
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
@@ -17,3 +28,29 @@ def page_not_found(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики Prometheus: для персонала или по ``METRICS_TOKEN``."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization, f'Bearer {token}')
+    )
+    if not allowed:
+        raise PermissionDenied
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+PROFILE_NAME = re.compile(r'^[\w-]+\.({})$'.format('|'.join(EXTENSIONS)))
+
+
+@staff_member_required
+def profile_download(request, name):
+    """Файл профиля запроса из ProfilerMiddleware."""
+    path = os.path.join(get_directory(), name)
+    if not PROFILE_NAME.match(name) or not os.path.exists(path):
+        raise Http404
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=name)
@@ -3,7 +3,7 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
-from .models import Post, Group, Comment, Follow
+from .models import Post, Group, Comment, Follow, UserStats
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -41,7 +41,16 @@ class FollowAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'posts_count', 'comment_count',
+                    'follower_count', 'following_count')
+    search_fields = ('user__username',)
+    readonly_fields = ('posts_count', 'comment_count',
+                       'follower_count', 'following_count')
+
+
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
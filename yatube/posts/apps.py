@@ -7,3 +7,6 @@ from django.utils.translation import gettext_lazy as _
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = _('Посты')
+
+    def ready(self):
+        from . import signals  # noqa: F401
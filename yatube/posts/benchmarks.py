@@ -0,0 +1,45 @@
+"""Helpers shared by the benchmark management commands"""
+
+import contextlib
+import os
+import tracemalloc
+
+from django.db import transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def rolled_back():
+    """Выполняет блок в транзакции и откатывает созданные им данные."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def current_rss() -> int:
+    """Текущий RSS процесса в байтах (0, если /proc недоступен)."""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return 0
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+@contextlib.contextmanager
+def measure_memory(result: dict):
+    """Записывает в ``result`` пик Python-аллокаций и прирост RSS блока."""
+    rss = current_rss()
+    tracemalloc.start()
+    try:
+        yield result
+    finally:
+        result['peak'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        result['rss'] = current_rss() - rss
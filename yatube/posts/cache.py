@@ -0,0 +1,78 @@
+"""Cache versions for posts pages"""
+
+import time
+
+from django.core.cache import cache
+
+from .models import Follow
+
+FEED_VERSION_KEY = 'posts:feed_version'
+GROUPS_VERSION_KEY = 'posts:groups_version'
+CONTENT_VERSION_KEY = 'posts:content_version'
+FOLLOW_VERSION_KEY = 'posts:follow_version:{}'
+
+
+def get_version(key: str) -> int:
+    """Текущее поколение кэша; отсутствующее создаётся заново."""
+    version = cache.get(key)
+    if version is None:
+        # Метка времени, а не 1: после вытеснения ключа номер поколения
+        # не должен совпасть с одним из прежних.
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key: str) -> None:
+    """Сдвигает поколение: все фрагменты со старым номером устаревают."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
+
+
+def feed_version() -> int:
+    return get_version(FEED_VERSION_KEY)
+
+
+def bump_feed_version() -> None:
+    bump_version(FEED_VERSION_KEY)
+
+
+def content_version() -> int:
+    """Поколение всего публичного контента для кэша анонимных страниц."""
+    return get_version(CONTENT_VERSION_KEY)
+
+
+def bump_content_version() -> None:
+    bump_version(CONTENT_VERSION_KEY)
+
+
+def bump_groups_version() -> None:
+    bump_version(GROUPS_VERSION_KEY)
+
+
+def follow_version(user_id: int) -> str:
+    """Поколение ленты подписок читателя с учётом правок групп."""
+    return '{}.{}'.format(
+        get_version(FOLLOW_VERSION_KEY.format(user_id)),
+        get_version(GROUPS_VERSION_KEY)
+    )
+
+
+def bump_follow_version(user_id: int) -> None:
+    bump_version(FOLLOW_VERSION_KEY.format(user_id))
+
+
+def bump_followers_versions(author_id: int) -> None:
+    """Сбрасывает ленты всех подписчиков автора одним set_many."""
+    followers = Follow.objects.filter(
+        author_id=author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    version = time.time_ns()
+    cache.set_many(
+        {FOLLOW_VERSION_KEY.format(user_id): version
+         for user_id in followers.iterator()},
+        None
+    )
@@ -0,0 +1,115 @@
+"""Conditional GET validators for posts views"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from core.paginator import PREVIOUS, CursorPaginator, decode_cursor
+from .cache import content_version, follow_version
+from .feeds import TimelinePaginator
+from .models import Post, TimelineEntry
+from .settings import FOLLOW_FEED_ENGINE, POSTS_PER_PAGE
+
+
+def page_rows(request, queryset, per_page: int = POSTS_PER_PAGE,
+              fields=('pk', 'updated'),
+              key_fields=CursorPaginator.key_fields) -> list:
+    """(pk, updated) постов видимой страницы без загрузки самих постов."""
+    rows = queryset.values_list(*fields)
+    if 'page' in request.GET and 'cursor' not in request.GET:
+        return list(Paginator(
+            rows.order_by(*(f'-{field}' for field in key_fields)), per_page
+        ).get_page(request.GET.get('page')))
+    decoded = decode_cursor(request.GET.get('cursor', ''))
+    key, older = None, True
+    if decoded is not None:
+        key, older = decoded[1:], decoded[0] != PREVIOUS
+    paginator = CursorPaginator(rows, per_page)
+    paginator.key_fields = key_fields
+    return list(paginator.page_queryset(key, older))
+
+
+def feed_validators(request, queryset):
+    rows = page_rows(request, queryset)
+    return rows, max((updated for _, updated in rows), default=None)
+
+
+def index_validators(request):
+    return feed_validators(request, Post.objects.all())
+
+
+def group_validators(request, slug):
+    return feed_validators(request, Post.objects.filter(group__slug=slug))
+
+
+def profile_validators(request, username):
+    return feed_validators(
+        request, Post.objects.filter(author__username=username)
+    )
+
+
+def follow_validators(request):
+    """Валидаторы из данных выбранного движка ленты, без join с Follow.
+
+    Для timeline — строки ``TimelineEntry`` страницы. Для merge — поколение
+    ленты читателя: его сдвигают посты, комментарии и подписки авторов,
+    так что запросов к базе нет совсем, но нет и Last-Modified.
+    """
+    engine = getattr(settings, 'FOLLOW_FEED_ENGINE', FOLLOW_FEED_ENGINE)
+    if engine == 'timeline':
+        rows = page_rows(
+            request, TimelineEntry.objects.filter(user=request.user),
+            fields=('post_id', 'post__updated'),
+            key_fields=TimelinePaginator.key_fields
+        )
+        return rows, max((updated for _, updated in rows), default=None)
+    if engine == 'merge':
+        return follow_version(request.user.pk), None
+    return feed_validators(
+        request, Post.objects.filter(author__following__user=request.user)
+    )
+
+
+def post_detail_validators(request, post_id):
+    post = Post.objects.filter(pk=post_id).order_by().annotate(
+        last_comment=Max('comments__created')
+    ).values_list('updated', 'last_comment').first()
+    if post is None:
+        return None, None
+    updated, last_comment = post
+    return post, max(updated, last_comment or updated)
+
+
+def conditional(validators):
+    """ETag и Last-Modified для view по функции ``validators``.
+
+    ``validators(request, *args, **kwargs)`` возвращает пару
+    (данные страницы для ETag, Last-Modified) и вызывается один раз
+    на запрос. В ETag также входят поколение контента (его сдвигают
+    сигналы моделей, в т.ч. правки групп, авторов и подписок),
+    пользователь и CSRF-cookie: страница с формой после повторного
+    входа не должна браться из кеша браузера.
+    """
+    def get(request, *args, **kwargs):
+        if not hasattr(request, '_posts_validators'):
+            request._posts_validators = validators(request, *args, **kwargs)
+        return request._posts_validators
+
+    def etag(request, *args, **kwargs):
+        raw = repr([
+            get(request, *args, **kwargs)[0],
+            content_version(),
+            request.get_full_path(),
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+            getattr(request, 'LANGUAGE_CODE', None),
+        ])
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return get(request, *args, **kwargs)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,117 @@
+"""Follow feed engines"""
+
+import heapq
+from itertools import islice
+
+from django.core.cache import cache
+
+from core.paginator import CursorPaginator
+from .models import Follow, Post, TimelineEntry
+from .settings import RECENT_POSTS_LIMIT, RECENT_POSTS_TIMEOUT
+
+RECENT_POSTS_KEY = 'posts:recent:{}'
+
+
+class FollowPaginator(CursorPaginator):
+    """Лента подписок прямым запросом через ``Follow``."""
+
+    def __init__(self, object_list, per_page, user=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user = user
+
+
+class TimelinePaginator(FollowPaginator):
+    """Лента подписок из материализованной таблицы ``TimelineEntry``."""
+
+    key_fields = ('created', 'post_id')
+
+    def get_queryset(self):
+        return TimelineEntry.objects.filter(user=self.user).select_related(
+            'post__author', 'post__group'
+        ).prefetch_related('post__renditions')
+
+    def fetch(self, key, older: bool) -> list:
+        return [entry.post for entry in super().fetch(key, older)]
+
+
+def get_recent_posts(author_ids) -> dict:
+    """Ключи (created, pk) последних постов авторов, от новых к старым.
+
+    Списки хранятся в кэше и ограничены ``RECENT_POSTS_LIMIT``;
+    недостающие строятся индексным запросом по автору.
+    """
+    keys = {RECENT_POSTS_KEY.format(pk): pk for pk in author_ids}
+    recent = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    for author_id in set(author_ids) - set(recent):
+        recent[author_id] = refresh_recent_posts(author_id)
+    return recent
+
+
+def refresh_recent_posts(author_id: int) -> list:
+    """Пересобирает кэшированный список последних постов автора."""
+    recent = list(
+        Post.objects.filter(author_id=author_id).order_by(
+            '-created', '-pk'
+        ).values_list('created', 'pk')[:RECENT_POSTS_LIMIT]
+    )
+    cache.set(RECENT_POSTS_KEY.format(author_id), recent,
+              RECENT_POSTS_TIMEOUT)
+    return recent
+
+
+def update_recent_posts(author_id: int) -> None:
+    """Обновляет список автора после записи, если он уже в кэше."""
+    if cache.get(RECENT_POSTS_KEY.format(author_id)) is not None:
+        refresh_recent_posts(author_id)
+
+
+class RecentPostsPaginator(FollowPaginator):
+    """Лента подписок слиянием кэшированных списков авторов (pull-модель).
+
+    Списки каждого автора уже упорядочены, поэтому страница собирается
+    k-way слиянием через ``heapq.merge`` без обращения к ``Follow`` join.
+    Если страница уходит глубже окна одного из обрезанных списков,
+    она строится обычным запросом по ``object_list``.
+    """
+
+    def fetch(self, key, older: bool) -> list:
+        author_ids = Follow.objects.filter(user=self.user).values_list(
+            'author_id', flat=True
+        )
+        lists = list(get_recent_posts(list(author_ids)).values())
+        # Всё, что новее горизонта, гарантированно есть в списках.
+        horizon = max(
+            (items[-1] for items in lists if len(items) >= RECENT_POSTS_LIMIT),
+            default=None
+        )
+        limit = self.per_page + 1
+        if older:
+            merged = heapq.merge(
+                *[[item for item in items if key is None or item < key]
+                  for items in lists],
+                reverse=True
+            )
+            found = list(islice(merged, limit))
+            exact = horizon is None or (
+                len(found) == limit and found[-1] >= horizon
+            )
+        else:
+            merged = heapq.merge(
+                *[[item for item in reversed(items) if item > key]
+                  for items in lists]
+            )
+            found = list(islice(merged, limit))
+            exact = horizon is None or key >= horizon
+        if not exact:
+            return super().fetch(key, older)
+        posts = Post.objects.select_related(
+            'author', 'group'
+        ).prefetch_related('renditions').in_bulk([pk for _, pk in found])
+        return [posts[pk] for _, pk in found if pk in posts]
+
+
+FOLLOW_FEED_PAGINATORS = {
+    'join': FollowPaginator,
+    'timeline': TimelinePaginator,
+    'merge': RecentPostsPaginator,
+}
@@ -3,6 +3,8 @@
 from django import forms
 
 from .models import Post, Comment
+from .uploads import (RejectedUpload, describe_image, normalize_image,
+                      too_large_error, validate_image)
 
 
 class PostForm(forms.ModelForm):
@@ -10,6 +12,38 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Недочитанный файл убираем до ImageField, иначе тот попробует
+        # открыть пустое содержимое и выдаст невнятную ошибку.
+        name = self.add_prefix('image')
+        self.image_rejected = isinstance(self.files.get(name),
+                                         RejectedUpload)
+        if self.image_rejected:
+            self.files = self.files.copy()
+            del self.files[name]
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if self.image_rejected:
+            raise too_large_error()
+        if hasattr(image, 'image'):
+            validate_image(image)
+        return image
+
+    def save(self, commit=True):
+        image = self.cleaned_data.get('image')
+        if 'image' in self.changed_data:
+            post = self.instance
+            if hasattr(image, 'image'):
+                post.image = normalize_image(image)
+                (post.image_width, post.image_height,
+                 post.image_placeholder) = describe_image(post.image)
+            else:
+                post.image_width = post.image_height = None
+                post.image_placeholder = ''
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
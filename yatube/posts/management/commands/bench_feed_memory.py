@@ -0,0 +1,59 @@
+"""Замер памяти страниц профиля и группы при большом числе постов."""
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+
+from posts import views
+from posts.benchmarks import measure_memory, rolled_back
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Показывает пик аллокаций и прирост RSS при рендере первой '
+            'страницы профиля и группы для разного числа постов автора. '
+            'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1000, 10000, 100000])
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>8} {:>12} {:>12}'.format(
+            'posts', 'page', 'peak, KiB', 'rss, KiB'))
+        for size in options['sizes']:
+            with rolled_back():
+                self.bench(size, options['batch_size'])
+
+    def bench(self, size, batch_size):
+        author = User.objects.create_user(username='bench_author')
+        group = Group.objects.create(title='bench', slug='bench-memory',
+                                     description='bench')
+        # bulk_create не шлёт сигналы: лента и счётчики здесь не нужны.
+        for start in range(0, size, batch_size):
+            Post.objects.bulk_create(
+                Post(text=f'bench {number}', author=author, group=group)
+                for number in range(start, min(size, start + batch_size))
+            )
+        factory = RequestFactory()
+        pages = [
+            ('profile', views.profile, 'posts:profile', author.username),
+            ('group', views.group_posts, 'posts:group_list', group.slug),
+        ]
+        for name, view, url_name, argument in pages:
+            request = factory.get(reverse(url_name, args=[argument]))
+            request.user = AnonymousUser()
+            # Замеряется рендер, а не выдача из кэша анонимных страниц.
+            view = view.__wrapped__
+            # Прогрев: компиляция шаблонов и строка счётчиков автора.
+            view(request, argument)
+            with measure_memory({}) as result:
+                view(request, argument)
+            self.stdout.write('{:>8} {:>8} {:>12.1f} {:>12.1f}'.format(
+                size, name, result['peak'] / 1024, result['rss'] / 1024
+            ))
@@ -0,0 +1,72 @@
+"""Сравнение движков ленты подписок на синтетических данных."""
+
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import rolled_back
+from posts.feeds import FOLLOW_FEED_PAGINATORS, RECENT_POSTS_KEY
+from posts.models import Follow, Post
+from posts.settings import POSTS_PER_PAGE
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет первую и глубокую страницу ленты подписок для '
+            'движков join, timeline и merge. Данные создаются в транзакции '
+            'и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, nargs='+',
+                            default=[10, 100, 1000])
+        parser.add_argument('--posts', type=int, default=20,
+                            help='Постов на автора.')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:>8} {:>10} {:>12} {:>12}'.format(
+            'authors', 'engine', 'first, ms', 'deep, ms'))
+        for authors in options['authors']:
+            with rolled_back():
+                self.bench(authors, options['posts'], options['repeat'])
+
+    def bench(self, authors, posts, repeat):
+        reader = User.objects.create_user(username='bench_reader')
+        User.objects.bulk_create(
+            User(username=f'bench_author_{number}')
+            for number in range(authors)
+        )
+        writers = User.objects.filter(username__startswith='bench_author_')
+        for writer in writers:
+            Follow.objects.create(user=reader, author=writer)
+        for number in range(posts):
+            for writer in writers:
+                Post.objects.create(text=f'bench {number}', author=writer)
+        queryset = Post.objects.select_related('author', 'group').filter(
+            author__following__user=reader
+        )
+        for engine, paginator_class in FOLLOW_FEED_PAGINATORS.items():
+            cache.delete_many(
+                [RECENT_POSTS_KEY.format(writer.pk) for writer in writers]
+            )
+            first = []
+            deep = []
+            for _ in range(repeat):
+                cursor = ''
+                for page in range(5):
+                    started = time.perf_counter()
+                    paginator = paginator_class(
+                        queryset, POSTS_PER_PAGE, cursor=cursor, user=reader
+                    )
+                    paginator.cursor_page()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    (first if page == 0 else deep).append(elapsed)
+                    cursor = paginator.next_cursor
+            self.stdout.write('{:>8} {:>10} {:>12.2f} {:>12.2f}'.format(
+                authors, engine,
+                statistics.median(first), statistics.median(deep)
+            ))
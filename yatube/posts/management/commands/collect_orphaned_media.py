@@ -0,0 +1,88 @@
+"""Удаление файлов медиа, на которые не ссылается ни одна запись."""
+
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, Rendition
+
+
+def scan(root: str, directory: str):
+    """Лениво обходит каталог и отдаёт (имя от MEDIA_ROOT, stat) файлов."""
+    stack = [directory]
+    while stack:
+        with os.scandir(os.path.join(root, stack.pop())) as entries:
+            for entry in entries:
+                name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    yield name, entry.stat(follow_symlinks=False)
+
+
+def referenced(names: list) -> set:
+    """Какие из ``names`` есть в базе: по запросу на пачку и поле."""
+    posts = Post.objects.filter(image__in=names)
+    renditions = Rendition.objects.filter(file__in=names)
+    return (set(posts.values_list('image', flat=True))
+            | set(renditions.values_list('file', flat=True)))
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из MEDIA_ROOT файлы, на которые не ссылаются посты и '
+            'копии картинок. Каталог обходится потоком, имена сверяются с '
+            'базой пачками, поэтому память не растёт с числом файлов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directories', nargs='*', default=['posts'],
+                            help='Каталоги внутри MEDIA_ROOT; старый кэш '
+                                 'sorl-thumbnail лежит в cache.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе стольких секунд: '
+                                 'их запись в базу может быть ещё впереди.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет удалено.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.deadline = time.time() - options['min_age']
+        self.scanned = self.orphans = self.freed = 0
+        batch_size = options['batch_size']
+        for directory in options['directories']:
+            if not os.path.isdir(os.path.join(settings.MEDIA_ROOT,
+                                              directory)):
+                continue
+            batch = {}
+            for name, stat in scan(settings.MEDIA_ROOT, directory):
+                self.scanned += 1
+                if stat.st_mtime < self.deadline:
+                    batch[name] = stat.st_size
+                if len(batch) == batch_size:
+                    self.collect(batch)
+                    batch = {}
+            if batch:
+                self.collect(batch)
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Просмотрено файлов: {self.scanned}. {verb}: {self.orphans}, '
+            f'{self.freed / 1024 / 1024:.1f} МБ'
+        ))
+
+    def collect(self, batch: dict):
+        for name in set(batch) - referenced(list(batch)):
+            path = os.path.join(settings.MEDIA_ROOT, name)
+            if self.dry_run:
+                self.stdout.write(name)
+            else:
+                try:
+                    # Файл могли переиспользовать после обхода каталога.
+                    if os.stat(path).st_mtime >= self.deadline:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            self.orphans += 1
+            self.freed += batch[name]
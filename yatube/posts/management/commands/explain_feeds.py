@@ -0,0 +1,121 @@
+"""EXPLAIN основных запросов лент на засеянных данных."""
+
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.paginator import CursorPaginator
+from posts import timeline
+from posts.benchmarks import rolled_back
+from posts.feeds import FollowPaginator, TimelinePaginator
+from posts.models import Comment, Follow, Group, Post
+from posts.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+User = get_user_model()
+
+COST_RE = re.compile(r'cost=[\d.]+\.\.([\d.]+)')
+INDEX_RE = re.compile(
+    r'(?:Index (?:Only )?Scan(?: Backward)? using|Bitmap Index Scan on'
+    r'|USING (?:COVERING )?INDEX|USING INTEGER PRIMARY KEY)\s*(\w*)'
+)
+
+
+class Command(BaseCommand):
+    help = ('Засевает данные (в откатываемой транзакции), выполняет EXPLAIN '
+            'для главного запроса каждой ленты и сообщает, какой индекс '
+            'использован и какова оценка стоимости.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=500)
+        parser.add_argument('--verbose-plan', action='store_true',
+                            help='Печатать планы целиком.')
+
+    def handle(self, *args, **options):
+        self.verbose_plan = options['verbose_plan']
+        with rolled_back():
+            reader, author, group, post = self.seed(
+                options['posts'], options['authors'], options['comments']
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.report(reader, author, group, post)
+
+    def seed(self, posts, authors, comments):
+        User.objects.bulk_create(
+            User(username=f'explain_{number}') for number in range(authors)
+        )
+        users = list(User.objects.filter(username__startswith='explain_'))
+        Group.objects.bulk_create(
+            Group(title=f'explain {number}', slug=f'explain-{number}',
+                  description='explain')
+            for number in range(5)
+        )
+        groups = list(Group.objects.filter(slug__startswith='explain-'))
+        Post.objects.bulk_create(
+            Post(text=f'explain {number}', author=users[number % authors],
+                 group=groups[number % len(groups)])
+            for number in range(posts)
+        )
+        reader = users[0]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=user) for user in users[1:authors // 2]
+        )
+        # bulk_create не шлёт сигналы: ленту читателя заполняем явно.
+        for user in users[1:authors // 2]:
+            timeline.backfill(reader.pk, user.pk)
+        post = Post.objects.filter(author=users[1]).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=users[number % authors],
+                    text=f'explain {number}')
+            for number in range(comments)
+        )
+        return reader, users[1], groups[0], post
+
+    def report(self, reader, author, group, post):
+        feed = Post.objects.select_related('author', 'group')
+        middle = feed.order_by('-created', '-pk')[feed.count() // 2]
+        deep_key = (middle.created, middle.pk)
+        queries = [
+            ('posts:index', CursorPaginator(
+                feed, POSTS_PER_PAGE).page_queryset(None, True)),
+            ('posts:index deep', CursorPaginator(
+                feed, POSTS_PER_PAGE).page_queryset(deep_key, True)),
+            ('posts:group_list', CursorPaginator(
+                group.posts.select_related('author', 'group'),
+                POSTS_PER_PAGE).page_queryset(None, True)),
+            ('posts:profile', CursorPaginator(
+                author.posts.select_related('author', 'group'),
+                POSTS_PER_PAGE).page_queryset(None, True)),
+            ('posts:profile following', Follow.objects.filter(
+                user=reader, author=author)),
+            ('posts:follow_index timeline', TimelinePaginator(
+                None, POSTS_PER_PAGE, user=reader
+            ).page_queryset(None, True)),
+            ('posts:follow_index join', FollowPaginator(
+                feed.filter(author__following__user=reader), POSTS_PER_PAGE
+            ).page_queryset(None, True)),
+            ('posts:post_detail comments', CursorPaginator(
+                Comment.objects.filter(post_id=post.pk).select_related(
+                    'author'),
+                COMMENTS_PER_PAGE).page_queryset(None, True)),
+        ]
+        self.stdout.write('{:<30} {:<32} {:>10}'.format(
+            'query', 'index', 'cost'))
+        for name, queryset in queries:
+            plan = queryset.explain()
+            indexes = [match or 'pk' for match in INDEX_RE.findall(plan)]
+            cost = COST_RE.search(plan)
+            line = '{:<30} {:<32} {:>10}'.format(
+                name,
+                ', '.join(dict.fromkeys(indexes)) or 'НЕТ (полный проход)',
+                cost.group(1) if cost else '-'
+            )
+            self.stdout.write(
+                line if indexes else self.style.WARNING(line)
+            )
+            if self.verbose_plan:
+                self.stdout.write(plan)
@@ -0,0 +1,34 @@
+"""Сверка денормализованных счётчиков пользователей с данными."""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, комментариев и подписок '
+            'пользователей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        checked = fixed = 0
+        batch = []
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) == batch_size:
+                fixed += reconcile(batch)
+                checked += len(batch)
+                batch = []
+        if batch:
+            fixed += reconcile(batch)
+            checked += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено пользователей: {checked}, исправлено: {fixed}'
+        ))
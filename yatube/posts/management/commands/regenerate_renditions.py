@@ -0,0 +1,179 @@
+"""Массовая перегенерация копий картинок постов в пуле процессов."""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from posts.models import Post
+from posts.renditions import (create_executor, render, shared_renditions,
+                              store)
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает копии картинок всех постов на всех ядрах. '
+            'Одинаковая картинка рисуется один раз за запуск. Прогресс '
+            'сохраняется в файл контрольной точки, поэтому прерванный '
+            'запуск продолжается с места остановки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Процессов в пуле; 0 — без пула.')
+        parser.add_argument('--checkpoint',
+                            default='.regenerate_renditions',
+                            help='Файл с id последнего готового поста.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать сначала, не читая контрольную точку.')
+        parser.add_argument('--progress-every', type=int, default=100)
+        parser.add_argument('--missing', action='store_true',
+                            help='Только посты без копий: загруженные до '
+                                 'них или пропущенные переполненным пулом.')
+
+    def handle(self, *args, **options):
+        self.checkpoint = options['checkpoint']
+        self.progress_every = options['progress_every']
+        start_after = 0 if options['restart'] else self.read_checkpoint()
+        posts = Post.objects.exclude(image='').filter(
+            pk__gt=start_after
+        ).order_by('pk')
+        if options['missing']:
+            posts = posts.filter(renditions__isnull=True)
+        self.missing = options['missing']
+        # Картинки хранятся по содержимому: у постов с одним именем файла
+        # одна картинка. Копии таких картинок держим, пока не раздадим всем.
+        self.shared = dict(posts.order_by().values_list('image').annotate(
+            total=Count('pk', distinct=True)).filter(total__gt=1))
+        self.rendered = {}
+        self.waiting = {}
+        self.total = posts.count()
+        self.done = self.failed = 0
+        self.started = time.monotonic()
+        if start_after:
+            self.stdout.write(f'Продолжаем после поста {start_after}')
+        rows = posts.values_list('pk', 'image').iterator()
+        workers = options['workers']
+        if workers:
+            self.run_pool(rows, workers)
+        else:
+            for pk, name in rows:
+                renditions = self.ready_renditions(pk, name)
+                if renditions is not None:
+                    self.finish([pk], name, lambda: renditions)
+                else:
+                    self.finish([pk], name, lambda: render(name))
+                self.write_checkpoint(pk)
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        self.report()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {self.done}, с ошибками: {self.failed}'
+        ))
+
+    def ready_renditions(self, pk, name):
+        """Уже построенные копии картинки поста; None — нужен рендер.
+
+        Подходят копии из этого запуска, а при ``--missing`` — и копии
+        другого поста с той же картинкой, как при загрузке.
+        """
+        renditions = self.rendered.get(name)
+        if renditions is None and self.missing:
+            renditions = shared_renditions(pk, name)
+        return renditions
+
+    def run_pool(self, rows, workers):
+        """Держит в пуле не больше ``workers * 2`` картинок одновременно.
+
+        Посты с картинкой, которая уже рисуется, ждут ту же задачу.
+        Задачи завершаются не по порядку, поэтому в контрольную точку
+        пишется наибольший id, до которого готово всё.
+        """
+        pending = {}
+        submitted = set()
+        with create_executor(workers) as executor:
+            for pk, name in rows:
+                renditions = self.ready_renditions(pk, name)
+                if renditions is not None:
+                    self.finish([pk], name, lambda: renditions)
+                    continue
+                submitted.add(pk)
+                if name in self.waiting:
+                    self.waiting[name].append(pk)
+                    continue
+                self.waiting[name] = [pk]
+                pending[executor.submit(render, name)] = name
+                if len(pending) >= workers * 2:
+                    self.collect(pending, submitted)
+            while pending:
+                self.collect(pending, submitted)
+
+    def collect(self, pending, submitted):
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            name = pending.pop(future)
+            pks = self.waiting.pop(name)
+            submitted.difference_update(pks)
+            self.finish(pks, name, future.result)
+            if submitted:
+                self.write_checkpoint(min(submitted) - 1)
+            else:
+                self.write_checkpoint(max(pks))
+
+    def finish(self, pks, name, result):
+        """Сохраняет копии одной картинки всем постам из ``pks``."""
+        try:
+            renditions = result()
+        except Exception as error:
+            self.remember(name, len(pks), None)
+            for pk in pks:
+                self.fail(pk, name, error)
+            return
+        self.remember(name, len(pks), renditions)
+        for pk in pks:
+            try:
+                store(pk, name, renditions)
+            except Exception as error:
+                self.fail(pk, name, error)
+            else:
+                self.done += 1
+                self.progress()
+
+    def remember(self, name, used, renditions):
+        """Держит копии общей картинки, пока их ждут другие посты."""
+        left = self.shared.pop(name, 0) - used
+        self.rendered.pop(name, None)
+        if left > 0:
+            self.shared[name] = left
+            if renditions is not None:
+                self.rendered[name] = renditions
+
+    def fail(self, pk, name, error):
+        self.failed += 1
+        self.stderr.write(f'Пост {pk}, {name}: {error}')
+        self.progress()
+
+    def progress(self):
+        if (self.done + self.failed) % self.progress_every == 0:
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        processed = self.done + self.failed
+        rate = processed / elapsed if elapsed else 0
+        left = (self.total - processed) / rate if rate else 0
+        self.stdout.write(
+            f'{processed}/{self.total} картинок, {rate:.1f} в секунду, '
+            f'осталось ~{left:.0f} с'
+        )
+
+    def read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def write_checkpoint(self, pk):
+        with open(self.checkpoint, 'w') as checkpoint:
+            checkpoint.write(str(pk))
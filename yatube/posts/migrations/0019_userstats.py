@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    counters = {
+        'posts_count': (apps.get_model('posts', 'Post'), 'author'),
+        'comment_count': (apps.get_model('posts', 'Comment'), 'author'),
+        'follower_count': (apps.get_model('posts', 'Follow'), 'user'),
+        'following_count': (apps.get_model('posts', 'Follow'), 'author'),
+    }
+    values = {pk: {} for pk in User.objects.values_list('pk', flat=True)}
+    for counter, (model, field) in counters.items():
+        rows = model.objects.filter(**{f'{field}__isnull': False}).values(
+            field).annotate(total=models.Count('pk')).values_list(
+            field, 'total')
+        for user_id, total in rows:
+            values[user_id][counter] = total
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk, **counts) for pk, counts in values.items()),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0018_timeline_post_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('comment_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+                ('follower_count', models.PositiveIntegerField(default=0, help_text='На скольких авторов подписан пользователь', verbose_name='Подписок')),
+                ('following_count', models.PositiveIntegerField(default=0, help_text='Сколько пользователей подписано на автора', verbose_name='Подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
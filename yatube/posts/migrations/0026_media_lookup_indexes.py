@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:37
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AlterField(
+            model_name='rendition',
+            name='file',
+            field=models.ImageField(db_index=True, upload_to='posts/renditions/', verbose_name='Файл'),
+        ),
+    ]
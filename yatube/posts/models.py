@@ -5,6 +5,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -59,16 +60,62 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name=_('Картинка'),
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        db_index=True
+    )
+    image_width = models.PositiveIntegerField(
+        _('Ширина картинки'),
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        _('Высота картинки'),
+        null=True,
+        blank=True,
+        editable=False
+    )
+    image_placeholder = models.TextField(
+        _('Заглушка картинки'),
+        blank=True,
+        editable=False,
+        help_text=_('Крошечная копия в data URI, видна до загрузки картинки')
+    )
+    updated = models.DateTimeField(
+        _('Дата изменения'),
+        auto_now=True,
+        help_text=_('Обновляется при каждом сохранении поста')
+    )
+    comments_count = models.PositiveIntegerField(
+        _('Комментариев'),
+        default=0,
+        editable=False,
+        help_text=_('Поддерживается сигналами при записи комментариев')
     )
 
     class Meta(CreatedModel.Meta):
         verbose_name = _('Пост')
         verbose_name_plural = _('Посты')
+        indexes = [
+            models.Index(fields=['created', 'id'],
+                         name='post_created_idx'),
+            models.Index(fields=['author', 'created', 'id'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', 'created', 'id'],
+                         name='post_group_created_idx'),
+        ]
 
     def __str__(self):
         return '{:.15}'.format(self.text)
 
+    def rendition_sets(self) -> dict:
+        """Копии картинки по форматам, от узкой к широкой, для srcset."""
+        sets = {}
+        for rendition in self.renditions.all():
+            sets.setdefault(rendition.format, []).append(rendition)
+        return sets
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -93,6 +140,10 @@ class Comment(CreatedModel):
     class Meta(CreatedModel.Meta):
         verbose_name = _('Комментарий')
         verbose_name_plural = _('Комментарии')
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return '{:.15}'.format(self.text)
@@ -125,9 +176,113 @@ class Follow(models.Model):
             models.CheckConstraint(check=~models.Q(user=models.F("author")),
                                    name="prevent_self_follow"),
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
 
     def __str__(self):
         return '{} followed {}'.format(
             self.user.get_username(),
             self.author.get_username()
         )
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: строка на пару (читатель, пост)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name=_('Читатель'),
+        help_text=_('Пользователь, в ленту которого попал пост')
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name=_('Пост'),
+        help_text=_('Пост автора, на которого подписан читатель')
+    )
+    created = models.DateTimeField(
+        _('Дата создания поста'),
+        help_text=_('Копия даты создания поста для сортировки ленты')
+    )
+
+    class Meta:
+        verbose_name = _('Запись ленты')
+        verbose_name_plural = _('Записи ленты')
+        ordering = ('-created', '-pk')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created', 'post'],
+                         name='timeline_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return '{} <- {}'.format(self.user_id, self.post_id)
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя для шапки профиля."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name=_('Пользователь')
+    )
+    posts_count = models.PositiveIntegerField(
+        _('Постов'),
+        default=0
+    )
+    comment_count = models.PositiveIntegerField(
+        _('Комментариев'),
+        default=0
+    )
+    follower_count = models.PositiveIntegerField(
+        _('Подписок'),
+        default=0,
+        help_text=_('На скольких авторов подписан пользователь')
+    )
+    following_count = models.PositiveIntegerField(
+        _('Подписчиков'),
+        default=0,
+        help_text=_('Сколько пользователей подписано на автора')
+    )
+
+    class Meta:
+        verbose_name = _('Статистика пользователя')
+        verbose_name_plural = _('Статистика пользователей')
+
+    def __str__(self):
+        return 'stats of {}'.format(self.user_id)
+
+
+class Rendition(models.Model):
+    """Заранее посчитанная уменьшенная копия картинки поста."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='renditions',
+        verbose_name=_('Пост')
+    )
+    file = models.ImageField(
+        _('Файл'),
+        upload_to='posts/renditions/',
+        db_index=True
+    )
+    width = models.PositiveIntegerField(_('Ширина'))
+    height = models.PositiveIntegerField(_('Высота'))
+    format = models.CharField(_('Формат'), max_length=10)
+
+    class Meta:
+        verbose_name = _('Копия картинки')
+        verbose_name_plural = _('Копии картинок')
+        ordering = ('width',)
+
+    def __str__(self):
+        return self.file.name
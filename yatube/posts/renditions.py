@@ -0,0 +1,187 @@
+"""Eager generation of post image renditions"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+from .cache import (bump_content_version, bump_feed_version,
+                    bump_followers_versions)
+from .models import Post, Rendition
+from .settings import (RENDITION_FORMATS, RENDITION_QUALITY,
+                       RENDITION_QUEUE_SIZE, RENDITION_SIZE, RENDITION_WIDTHS,
+                       RENDITION_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_slots = threading.BoundedSemaphore(RENDITION_QUEUE_SIZE)
+_lock = threading.Lock()
+
+
+EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+SAVE_OPTIONS = {
+    'jpeg': {'optimize': True, 'progressive': True},
+    'webp': {'method': 4},
+}
+
+
+def get_widths(source_width: int) -> list:
+    """Ширины копий без увеличения: самая узкая строится всегда."""
+    widths = sorted(RENDITION_WIDTHS)
+    return [width for width in widths
+            if width <= source_width] or widths[:1]
+
+
+def get_formats() -> list:
+    """Форматы копий, которые умеет сохранять установленный Pillow."""
+    return [image_format for image_format in RENDITION_FORMATS
+            if image_format == 'jpeg' or features.check(image_format)]
+
+
+def render(name: str) -> list:
+    """Строит копии картинки ``name`` и кладёт их в хранилище.
+
+    Кадр с пропорциями ``RENDITION_SIZE`` вырезается один раз, а каждая
+    ширина из ``RENDITION_WIDTHS`` сохраняется во всех форматах.
+    Работает без базы данных, поэтому годится для процесса пула.
+    Возвращает описания копий для ``Rendition``.
+    """
+    base_width, base_height = RENDITION_SIZE
+    with Post.image.field.storage.open(name) as source:
+        image = Image.open(source)
+        widths = get_widths(image.width)
+        largest = (widths[-1], round(widths[-1] * base_height / base_width))
+        image.draft('RGB', largest)
+        image = ImageOps.fit(image.convert('RGB'), largest, Image.LANCZOS,
+                             centering=(0.5, 0.5))
+    stem = os.path.splitext(os.path.basename(name))[0]
+    renditions = []
+    for width in widths:
+        size = (width, round(width * base_height / base_width))
+        resized = image if size == image.size else image.resize(
+            size, Image.LANCZOS
+        )
+        for image_format in get_formats():
+            buffer = BytesIO()
+            resized.save(buffer, image_format.upper(),
+                         quality=RENDITION_QUALITY,
+                         **SAVE_OPTIONS[image_format])
+            saved = default_storage.save(
+                f'{Rendition.file.field.upload_to}{stem}_'
+                f'{size[0]}x{size[1]}.{EXTENSIONS[image_format]}',
+                ContentFile(buffer.getvalue())
+            )
+            renditions.append({'file': saved, 'width': size[0],
+                               'height': size[1], 'format': image_format})
+    return renditions
+
+
+def store(post_id: int, name: str, renditions: list) -> None:
+    """Заменяет копии поста новыми, если картинка за это время не сменилась.
+
+    Файлы старых и ненужных копий остаются чистке сирот: их может делить
+    пост с той же картинкой.
+    """
+    post = Post.objects.filter(pk=post_id, image=name).first()
+    if post is None:
+        return
+    post.renditions.all().delete()
+    Rendition.objects.bulk_create(
+        Rendition(post=post, **rendition) for rendition in renditions
+    )
+    # bulk_create не шлёт сигналов: кэш страниц со старыми копиями
+    # сбрасывается здесь.
+    bump_content_version()
+    bump_feed_version()
+    bump_followers_versions(post.author_id)
+
+
+def shared_renditions(post_id: int, name: str):
+    """Копии другого поста с тем же файлом картинки; None — таких нет.
+
+    Картинки хранятся по содержимому, так что одинаковое имя означает
+    одинаковую картинку и перерисовывать её незачем.
+    """
+    source = Rendition.objects.filter(post__image=name).exclude(
+        post_id=post_id
+    ).values_list('post_id', flat=True).first()
+    if source is None:
+        return None
+    return list(Rendition.objects.filter(post_id=source).values(
+        'file', 'width', 'height', 'format'
+    ))
+
+
+def reuse(post: Post) -> bool:
+    """Отдаёт посту копии другого поста с тем же файлом картинки."""
+    renditions = shared_renditions(post.pk, post.image.name)
+    if renditions is None:
+        return False
+    store(post.pk, post.image.name, renditions)
+    return True
+
+
+def _done(post_id, name, future):
+    try:
+        store(post_id, name, future.result())
+    except Exception:
+        logger.exception('Не удалось построить копии картинки %s', name)
+    finally:
+        _slots.release()
+        close_old_connections()
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor:
+    """Пул процессов, в каждом из которых Django уже настроен."""
+    return ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = create_executor(workers)
+        return _executor
+
+
+def schedule(post: Post) -> None:
+    """Ставит построение копий картинки поста в пул процессов.
+
+    Очередь ограничена ``RENDITION_QUEUE_SIZE``: при переполнении задача
+    не ставится, а шаблон показывает исходную картинку. Без пула
+    (``RENDITION_WORKERS = 0``) копии строятся прямо в запросе.
+    """
+    if not post.image:
+        return
+    if reuse(post):
+        return
+    workers = getattr(settings, 'RENDITION_WORKERS', RENDITION_WORKERS)
+    name = post.image.name
+    if not workers:
+        try:
+            store(post.pk, name, render(name))
+        except (OSError, ValueError):
+            logger.exception('Не удалось построить копии картинки %s', name)
+        return
+    if not _slots.acquire(blocking=False):
+        logger.warning('Очередь копий картинок заполнена, %s пропущена',
+                       name)
+        return
+    try:
+        future = _get_executor(workers).submit(render, name)
+    except RuntimeError:
+        _slots.release()
+        logger.exception('Пул копий картинок недоступен')
+        return
+    future.add_done_callback(
+        lambda future: _done(post.pk, name, future)
+    )
@@ -1,3 +1,59 @@
 """Posts settings"""
 
 POSTS_PER_PAGE: int = 10
+
+COMMENTS_PER_PAGE: int = 20
+
+TIMELINE_BATCH_SIZE: int = 500
+
+FOLLOW_FEED_ENGINE: str = 'timeline'
+"""Движок ленты подписок: timeline, merge или join.
+
+Переопределяется настройкой ``FOLLOW_FEED_ENGINE`` проекта.
+"""
+
+RECENT_POSTS_LIMIT: int = 200
+RECENT_POSTS_TIMEOUT: int = 60 * 60 * 24
+
+ANONYMOUS_PAGE_TIMEOUT: int = 60 * 60
+
+RENDITION_SIZE: tuple = (960, 339)
+"""Кадр копий картинки: ширина основной копии и пропорции всех остальных."""
+
+RENDITION_WIDTHS: tuple = (480, 960, 1440)
+"""Ширины копий для srcset; шире исходной картинки копии не строятся."""
+
+RENDITION_FORMATS: tuple = ('webp', 'jpeg')
+"""Форматы копий; JPEG обязателен — им отвечают браузеры без WebP."""
+
+RENDITION_QUALITY: int = 85
+
+RENDITION_WORKERS: int = 0
+"""Процессов в пуле генерации копий картинок; 0 — считать в запросе.
+
+Переопределяется настройкой ``RENDITION_WORKERS`` проекта.
+"""
+
+RENDITION_QUEUE_SIZE: int = 32
+"""Сколько картинок может ждать пула; сверх этого задачи не ставятся."""
+
+IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+"""Предел размера загружаемого файла; сверх него байты не читаются.
+
+Здесь и ниже значения переопределяются одноимёнными настройками проекта.
+"""
+
+IMAGE_MAX_PIXELS: int = 40_000_000
+"""Предел ширины × высоты по заголовку картинки, до её декодирования."""
+
+IMAGE_MAX_SIDE: int = 2560
+"""Оригиналы больше этой стороны уменьшаются один раз при сохранении."""
+
+IMAGE_FORMATS: tuple = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+IMAGE_QUALITY: int = 90
+
+PLACEHOLDER_WIDTH: int = 24
+"""Ширина заглушки картинки; пропорции те же, что у RENDITION_SIZE."""
+
+PLACEHOLDER_QUALITY: int = 50
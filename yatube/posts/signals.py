@@ -0,0 +1,136 @@
+"""Posts signals configuration"""
+
+import threading
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import feeds, stats, timeline
+from .cache import (bump_content_version, bump_feed_version,
+                    bump_follow_version, bump_followers_versions,
+                    bump_groups_version)
+from .models import Comment, Follow, Group, Post, User
+
+# Каскадное удаление поста или пользователя шлёт post_delete на каждый
+# комментарий: кэш лент сбрасывается один раз на всё удаление.
+_local = threading.local()
+
+
+def deleting_posts() -> set:
+    return _local.__dict__.setdefault('posts', set())
+
+
+def deleting_users() -> dict:
+    return _local.__dict__.setdefault('users', {})
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Follow)
+@receiver([post_save, post_delete], sender=User)
+def content_changed(sender, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login — страницы те же.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    bump_content_version()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    bump_feed_version()
+    bump_followers_versions(instance.author_id)
+    if created and not raw:
+        timeline.fan_out(instance)
+        feeds.update_recent_posts(instance.author_id)
+        stats.bump(instance.author_id, 'posts_count', 1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    deleting_posts().add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    deleting_posts().discard(instance.pk)
+    bump_feed_version()
+    bump_followers_versions(instance.author_id)
+    feeds.update_recent_posts(instance.author_id)
+    stats.bump(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    bump_feed_version()
+    bump_groups_version()
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    deleting_users()[instance.pk] = set()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    authors = deleting_users().pop(instance.pk, set())
+    if authors:
+        bump_feed_version()
+    for author_id in authors:
+        bump_followers_versions(author_id)
+
+
+def comments_changed(comment: Comment, delta: int) -> None:
+    Post.objects.filter(pk=comment.post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+    stats.bump(comment.author_id, 'comment_count', delta)
+    # Пост удаляется вместе с комментариями: кэш сбросит post_deleted.
+    if comment.post_id in deleting_posts():
+        return
+    # Число комментариев видно в карточках лент.
+    if Comment.post.is_cached(comment):
+        author_id = comment.post.author_id
+    else:
+        author_id = Post.objects.filter(pk=comment.post_id).values_list(
+            'author_id', flat=True).first()
+    if author_id is None:
+        return
+    authors = deleting_users().get(comment.author_id)
+    if authors is not None:
+        authors.add(author_id)
+        return
+    bump_feed_version()
+    bump_followers_versions(author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        comments_changed(instance, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    comments_changed(instance, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.bump(instance.author_id, 'following_count', 1)
+        if instance.user_id:
+            timeline.backfill(instance.user_id, instance.author_id)
+            stats.bump(instance.user_id, 'follower_count', 1)
+            bump_follow_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, 'following_count', -1)
+    if instance.user_id:
+        timeline.trim(instance.user_id, instance.author_id)
+        stats.bump(instance.user_id, 'follower_count', -1)
+        bump_follow_version(instance.user_id)
@@ -0,0 +1,61 @@
+"""Denormalized user counters"""
+
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+
+# Счётчик -> (модель, поле пользователя), по которым он пересчитывается.
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'comment_count': (Comment, 'author'),
+    'follower_count': (Follow, 'user'),
+    'following_count': (Follow, 'author'),
+}
+
+
+def bump(user_id: int, counter: str, delta: int) -> None:
+    """Атомарно сдвигает счётчик; строку без данных собирает с нуля."""
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{counter: F(counter) + delta}
+    )
+    if not updated and delta > 0:
+        reconcile([user_id])
+
+
+def count_for(user_ids) -> dict:
+    """Точные значения счётчиков: по запросу с GROUP BY на счётчик."""
+    values = {pk: dict.fromkeys(COUNTERS, 0) for pk in user_ids}
+    for counter, (model, field) in COUNTERS.items():
+        rows = model.objects.filter(
+            **{f'{field}__in': user_ids}
+        ).values(field).annotate(total=Count('pk')).values_list(
+            field, 'total'
+        )
+        for user_id, total in rows:
+            values[user_id][counter] = total
+    return values
+
+
+def reconcile(user_ids) -> int:
+    """Пересчитывает счётчики пользователей, возвращает число исправлений."""
+    existing = UserStats.objects.in_bulk(user_ids)
+    fixed = 0
+    for user_id, values in count_for(user_ids).items():
+        stats = existing.get(user_id)
+        if stats is None:
+            UserStats.objects.get_or_create(user_id=user_id, defaults=values)
+            fixed += 1
+        elif any(getattr(stats, name) != value
+                 for name, value in values.items()):
+            UserStats.objects.filter(user_id=user_id).update(**values)
+            fixed += 1
+    return fixed
+
+
+def get_stats(user: User) -> UserStats:
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        reconcile([user.pk])
+        return UserStats.objects.get(user_id=user.pk)
@@ -0,0 +1,15 @@
+"""Учёт ссылок на общие файлы картинок.
+
+Файл могут делить несколько постов и копий, а повторная загрузка тех же
+байтов может записать на него ссылку в любой момент. Поэтому при удалении
+записей файлы не удаляются: их забирает ``collect_orphaned_media``, когда
+на файл нет ссылок и он не трогался дольше ``--min-age``.
+"""
+
+from .models import Post, Rendition
+
+
+def is_referenced(name: str) -> bool:
+    """Есть ли пост или копия с файлом ``name``."""
+    return (Post.objects.filter(image=name).exists()
+            or Rendition.objects.filter(file=name).exists())
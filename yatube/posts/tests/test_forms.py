@@ -1,16 +1,25 @@
 # posts/tests/test_forms.py
 
+import hashlib
+import os
 import shutil
 import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from PIL import Image
 
+from .. import renditions
 from ..models import Post, Group, User, Comment
-from ..urls import app_name
 
 USERNAME = 'test_user'
 USERNAME_AUTH = 'test_auth_user'
@@ -36,7 +45,7 @@ POST_CREATE_URL = reverse('posts:post_create')
 REDIRECTS_POST_CREATE_URL = (f'{reverse(settings.LOGIN_URL)}'
                              f'?next={POST_CREATE_URL}')
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 IMAGE_FILE_NAME = 'small.gif'
 NEW_IMAGE_FILE_NAME = 'new_small.gif'
 ANOTHER_IMAGE_FILE_NAME = 'another_small.gif'
@@ -47,9 +56,12 @@ SMALL_GIF = (
     b'\x00\x00\x01\x00\x01\x00\x00\x02'
     b'\x02\x4c\x01\x00\x3b'
 )
+SMALL_GIF_DIGEST = hashlib.sha256(SMALL_GIF).hexdigest()
+SMALL_GIF_NAME = (f'{Post.image.field.upload_to}'
+                  f'{SMALL_GIF_DIGEST[:2]}/{SMALL_GIF_DIGEST}.gif')
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=0)
 class PostCreateFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -138,9 +150,216 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.author, self.user_auth)
-        self.assertEqual(post.image,
-                         (f"{Post.image.field.upload_to}"
-                          f"{form_data['image'].name}"))
+        self.assertEqual(post.image, SMALL_GIF_NAME)
+
+    @override_settings(RENDITION_WORKERS=0)
+    def test_create_post_makes_renditions(self):
+        """Копии картинки для srcset готовятся сразу при создании поста."""
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500)).save(buffer, 'PNG')
+        self.another.post(
+            POST_CREATE_URL,
+            data={'text': POST_TEXT, 'image': SimpleUploadedFile(
+                'wide.png', buffer.getvalue(), content_type='image/png'
+            )},
+        )
+        post = self.user_auth.posts.latest('created')
+        self.assertEqual(
+            set(post.renditions.values_list('width', 'height', 'format')),
+            {(480, 170, 'jpeg'), (480, 170, 'webp'),
+             (960, 339, 'jpeg'), (960, 339, 'webp')}
+        )
+        for rendition in post.renditions.all():
+            with self.subTest(rendition=rendition.file.name):
+                self.assertTrue(
+                    rendition.file.storage.exists(rendition.file.name)
+                )
+                self.assertEqual(
+                    Image.open(rendition.file).size,
+                    (rendition.width, rendition.height)
+                )
+        response = self.guest.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        large = post.renditions.get(width=960, format='webp')
+        self.assertContains(response, f'{large.file.url} 960w')
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_regenerate_renditions_resumes(self):
+        """Команда перестраивает копии и продолжает с контрольной точки."""
+        buffer = BytesIO()
+        Image.new('RGB', (600, 300)).save(buffer, 'PNG')
+        done, left = (
+            Post.objects.create(
+                text=POST_TEXT,
+                author=self.user,
+                image=SimpleUploadedFile(name, buffer.getvalue()),
+            ) for name in ('done.png', 'left.png')
+        )
+        checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+        with open(checkpoint, 'w') as file:
+            file.write(str(done.pk))
+        call_command('regenerate_renditions', workers=0,
+                     checkpoint=checkpoint, stdout=StringIO(),
+                     stderr=StringIO())
+        self.assertFalse(done.renditions.exists())
+        self.assertEqual(
+            set(left.renditions.values_list('width', 'format')),
+            {(480, 'jpeg'), (480, 'webp')}
+        )
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_regenerate_renders_shared_image_once(self):
+        """Посты с одной картинкой получают копии одного рендера."""
+        buffer = BytesIO()
+        Image.new('RGB', (600, 300)).save(buffer, 'PNG')
+        posts = [
+            Post.objects.create(
+                text=POST_TEXT,
+                author=self.user,
+                image=SimpleUploadedFile(name, buffer.getvalue()),
+            ) for name in ('first.png', 'second.png', 'third.png')
+        ]
+        with mock.patch(
+                'posts.management.commands.regenerate_renditions.render',
+                wraps=renditions.render) as render:
+            call_command('regenerate_renditions', workers=0,
+                         checkpoint=os.path.join(TEMP_MEDIA_ROOT, 'shared'),
+                         stdout=StringIO(), stderr=StringIO())
+        render.assert_any_call(posts[0].image.name)
+        self.assertEqual(
+            render.call_args_list.count(mock.call(posts[0].image.name)), 1
+        )
+        files = [
+            set(post.renditions.values_list('file', flat=True))
+            for post in posts
+        ]
+        self.assertEqual(len(files[0]), 2)
+        self.assertEqual(files[1], files[0])
+        self.assertEqual(files[2], files[0])
+
+    def test_regenerate_missing_renditions(self):
+        """Досчёт трогает только посты без копий."""
+        images = {}
+        for color in ('red', 'blue'):
+            buffer = BytesIO()
+            Image.new('RGB', (600, 300), color).save(buffer, 'PNG')
+            images[color] = buffer.getvalue()
+        ready, copy, old = (
+            Post.objects.create(
+                text=POST_TEXT,
+                author=self.user,
+                image=SimpleUploadedFile(name, images[color]),
+            ) for name, color in (('ready.png', 'red'), ('copy.png', 'red'),
+                                  ('old.png', 'blue'))
+        )
+        ready.renditions.create(file='posts/renditions/ready.jpg',
+                                width=480, height=240, format='jpeg')
+        with mock.patch(
+                'posts.management.commands.regenerate_renditions.render',
+                wraps=renditions.render) as render:
+            call_command('regenerate_renditions', workers=0, missing=True,
+                         checkpoint=os.path.join(TEMP_MEDIA_ROOT, 'missing'),
+                         stdout=StringIO(), stderr=StringIO())
+        render.assert_any_call(old.image.name)
+        self.assertNotIn(mock.call(copy.image.name), render.call_args_list)
+        self.assertEqual(
+            list(ready.renditions.values_list('file', flat=True)),
+            ['posts/renditions/ready.jpg']
+        )
+        # Та же картинка, что у ready: копии берутся готовые.
+        self.assertEqual(
+            list(copy.renditions.values_list('file', flat=True)),
+            ['posts/renditions/ready.jpg']
+        )
+        self.assertEqual(
+            set(old.renditions.values_list('width', 'format')),
+            {(480, 'jpeg'), (480, 'webp')}
+        )
+
+    @override_settings(RENDITION_WORKERS=0)
+    def test_same_image_is_stored_once(self):
+        """Одинаковая картинка хранится одним файлом с общими копиями."""
+        buffer = BytesIO()
+        Image.new('RGB', (500, 200)).save(buffer, 'PNG')
+        for name in ('first.png', 'second.png'):
+            self.another.post(POST_CREATE_URL, data={
+                'text': POST_TEXT,
+                'image': SimpleUploadedFile(name, buffer.getvalue()),
+            })
+        first, second = self.user_auth.posts.order_by('pk')
+        digest = hashlib.sha256(buffer.getvalue()).hexdigest()
+        self.assertEqual(first.image.name, f'posts/{digest[:2]}/{digest}.png')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(
+            list(second.renditions.values_list('file', flat=True)),
+            list(first.renditions.values_list('file', flat=True))
+        )
+        storage = first.image.storage
+        names = [first.image.name, first.renditions.first().file.name]
+        Post.objects.filter(pk__in=[first.pk, second.pk]).delete()
+        old = time.time() - 2 * 60 * 60
+        for name in names:
+            self.assertTrue(storage.exists(name))
+            os.utime(storage.path(name), (old, old))
+        # Та же картинка загружается снова, пока строка ещё не записана.
+        storage.save('posts/again.png', ContentFile(buffer.getvalue()))
+        call_command('collect_orphaned_media', stdout=StringIO())
+        self.assertTrue(storage.exists(names[0]))
+        self.assertFalse(storage.exists(names[1]))
+
+    def test_oversized_image_is_rejected(self):
+        """Слишком большой файл или картинка не принимаются формой."""
+        buffer = BytesIO()
+        Image.new('RGB', (40, 40)).save(buffer, 'PNG')
+        cases = {
+            'IMAGE_MAX_BYTES': 10,
+            'IMAGE_MAX_PIXELS': 1000,
+        }
+        posts_count = Post.objects.count()
+        for setting, limit in cases.items():
+            with self.subTest(setting=setting), self.settings(
+                **{setting: limit}
+            ):
+                response = self.another.post(POST_CREATE_URL, data={
+                    'text': POST_TEXT,
+                    'image': SimpleUploadedFile('big.png', buffer.getvalue()),
+                })
+                self.assertTrue(response.context['form'].has_error('image'))
+                self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_image_is_downscaled_without_exif(self):
+        """Большой оригинал уменьшается при сохранении, EXIF убирается."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200)).save(buffer, 'JPEG', exif=exif)
+        self.another.post(POST_CREATE_URL, data={
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile('photo.jpg', buffer.getvalue()),
+        })
+        post = self.user_auth.posts.latest('created')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+
+    def test_image_placeholder_is_inlined(self):
+        """При загрузке сохраняются размеры и заглушка, лента её встраивает."""
+        buffer = BytesIO()
+        Image.new('RGB', (300, 150), 'red').save(buffer, 'JPEG')
+        self.another.post(POST_CREATE_URL, data={
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile('red.jpg', buffer.getvalue()),
+        })
+        post = self.user_auth.posts.latest('created')
+        self.assertEqual((post.image_width, post.image_height), (300, 150))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,')
+        )
+        response = self.guest.get(PROFILE_AUTH_URL)
+        self.assertContains(response, post.image_placeholder)
+        self.assertContains(response, 'loading="lazy"')
 
     def test_cant_create_post_by_guest(self):
         """Аноним не создает пост."""
@@ -181,7 +400,7 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.author, self.post.author)
-        self.assertEqual(post.image, f"{app_name}/{form_data['image'].name}")
+        self.assertEqual(post.image, SMALL_GIF_NAME)
 
     def test_cant_change_post_by_another_author(self):
         """Пользоветель не являющийся автором не изменяет чужой пост."""
@@ -268,3 +487,60 @@ class PostCreateFormTests(TestCase):
                         response.context.get('form').fields.get(value),
                         expected
                     )
+
+    def test_collect_orphaned_media(self):
+        """Чистка удаляет только старые файлы без ссылок из базы."""
+        storage = self.post.image.storage
+        old = time.time() - 2 * 60 * 60
+        names = {
+            'orphan': storage.save('posts/orphan.gif', ContentFile(b'1')),
+            'fresh': storage.save('posts/fresh.gif', ContentFile(b'2')),
+            'rendition': storage.save('posts/renditions/x.jpg',
+                                      ContentFile(b'3')),
+        }
+        for key in ('orphan', 'rendition'):
+            os.utime(storage.path(names[key]), (old, old))
+        os.utime(storage.path(self.post.image.name), (old, old))
+        call_command('collect_orphaned_media', dry_run=True,
+                     stdout=StringIO())
+        self.assertTrue(storage.exists(names['orphan']))
+        call_command('collect_orphaned_media', batch_size=2,
+                     stdout=StringIO())
+        self.assertFalse(storage.exists(names['orphan']))
+        self.assertFalse(storage.exists(names['rendition']))
+        self.assertTrue(storage.exists(names['fresh']))
+        self.assertTrue(storage.exists(self.post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=1)
+class RenditionPoolTests(TransactionTestCase):
+    """Копии строит пул процессов, а сохраняет обратный вызов."""
+
+    def setUp(self):
+        # Пул заводится под настройками теста, дочерние процессы
+        # наследуют их при fork.
+        renditions._executor = None
+        self.addCleanup(setattr, renditions, '_executor', None)
+
+    def test_schedule_renders_in_pool(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), 'green').save(buffer, 'PNG')
+        post = Post.objects.create(
+            text=POST_TEXT,
+            author=User.objects.create_user(username=USERNAME),
+            image=SimpleUploadedFile('pool.png', buffer.getvalue(),
+                                     content_type='image/png')
+        )
+        renditions.schedule(post)
+        self.assertIsNotNone(renditions._executor)
+        # shutdown дожидается задачи и обратного вызова _done.
+        renditions._executor.shutdown(wait=True)
+        self.assertEqual(
+            set(post.renditions.values_list('width', 'format')),
+            {(480, 'jpeg'), (480, 'webp'), (960, 'jpeg'), (960, 'webp')}
+        )
+        for rendition in post.renditions.all():
+            with self.subTest(rendition=rendition.file.name):
+                self.assertTrue(
+                    rendition.file.storage.exists(rendition.file.name)
+                )
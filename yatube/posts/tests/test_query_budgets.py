@@ -0,0 +1,235 @@
+# posts/tests/test_query_budgets.py
+
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from PIL import Image
+
+from core.decorators import get_query_budget
+from core.testing import QueryBudgetMixin
+from ..feeds import FOLLOW_FEED_PAGINATORS
+from ..models import Comment, Follow, Group, Post, Rendition, User
+from ..renditions import get_formats
+from ..settings import RENDITION_WIDTHS
+
+AUTHORS = 12
+POSTS = 150
+COMMENTS_PER_POST = 4
+GROUPS = 3
+PASSWORD = 'Budget-pass-42'
+BUDGET_NAMESPACES = ('posts', 'users', 'about')
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(name: str) -> SimpleUploadedFile:
+    buffer = BytesIO()
+    Image.new('RGB', (1000, 500), name).save(buffer, 'PNG')
+    return SimpleUploadedFile(f'{name}.png', buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=0)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число SQL на страницу не зависит от объёма данных."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        groups = [
+            Group.objects.create(title=f'Группа {number}',
+                                 slug=f'group-{number}',
+                                 description='Описание')
+            for number in range(GROUPS)
+        ]
+        cls.authors = [
+            User.objects.create_user(f'author{number}',
+                                     f'author{number}@yatube.ru',
+                                     PASSWORD)
+            for number in range(AUTHORS)
+        ]
+        cls.reader = User.objects.create_user('reader')
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            for other in cls.authors:
+                if other != author:
+                    Follow.objects.create(user=author, author=other)
+        for number in range(POSTS):
+            post = Post.objects.create(
+                author=cls.authors[number % AUTHORS],
+                group=groups[number % GROUPS],
+                text=f'Пост {number}',
+                image=f'posts/{number:02x}/{number}.jpg'
+                if number % 3 == 0 else ''
+            )
+            if post.image:
+                Rendition.objects.bulk_create(
+                    Rendition(post=post, format=image_format,
+                              width=width, height=width,
+                              file=f'posts/renditions/{number}-{width}'
+                                   f'.{image_format}')
+                    for image_format in get_formats()
+                    for width in RENDITION_WIDTHS
+                )
+            for comment in range(COMMENTS_PER_POST):
+                Comment.objects.create(
+                    post=post,
+                    author=cls.authors[(number + comment) % AUTHORS],
+                    text=f'Комментарий {comment}'
+                )
+        cls.author = cls.authors[0]
+        cls.post = Post.objects.filter(author=cls.author).latest('created')
+
+    def setUp(self):
+        # Бюджет считается для промаха кэша анонимных страниц.
+        cache.clear()
+        self.guest = Client()
+        self.user = Client()
+        self.user.force_login(self.author)
+        self.reader = Client()
+        self.reader.force_login(User.objects.get(username='reader'))
+
+    def test_pages(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=['group-0']),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('about:author'),
+            reverse('about:tech'),
+            reverse('users:signup'),
+            reverse('users:login'),
+            reverse('users:password_reset_form'),
+            reverse('users:password_reset_done'),
+            reverse('users:password_reset_complete'),
+        ]
+        for url in urls:
+            for client in (self.guest, self.user):
+                with self.subTest(url=url, client=client):
+                    cache.clear()
+                    self.assertWithinBudget(client, url)
+
+    def test_pages_for_user(self):
+        urls = [
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', args=[self.post.pk]),
+            reverse('posts:profile', args=[self.authors[1].username]),
+            reverse('users:password_change_form'),
+            reverse('users:password_change_done'),
+        ]
+        for url in urls:
+            for client in (self.user, self.reader):
+                with self.subTest(url=url, client=client):
+                    self.assertWithinBudget(client, url)
+
+    def test_next_pages(self):
+        """Глубокие страницы лент не дороже первой."""
+        for url in (reverse('posts:index'),
+                    reverse('posts:profile', args=[self.author.username])):
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                cursor = response.context['page_obj'].paginator.next_cursor
+                cache.clear()
+                self.assertWithinBudget(self.guest, url, data={
+                    'cursor': cursor
+                })
+
+    def test_follow_index_engines(self):
+        url = reverse('posts:follow_index')
+        for engine in FOLLOW_FEED_PAGINATORS:
+            with self.subTest(engine=engine), self.settings(
+                    FOLLOW_FEED_ENGINE=engine):
+                # Списки авторов для merge живут в кэше: бюджет считается
+                # для прогретого кэша, как в работающем сервисе.
+                self.reader.get(url)
+                response = self.assertWithinBudget(self.reader, url)
+                cursor = response.context['page_obj'].paginator.next_cursor
+                self.assertWithinBudget(self.reader, url,
+                                        data={'cursor': cursor})
+
+    def test_actions(self):
+        """Рассылка в ленты подписчиков и счётчики не растут с данными."""
+        self.assertWithinBudget(self.user, reverse('posts:post_create'),
+                                'post', {'text': 'Новый пост'})
+        self.assertWithinBudget(self.user, reverse('posts:post_create'),
+                                'post', {'text': 'Пост с картинкой',
+                                         'image': make_image('red')})
+        self.assertWithinBudget(
+            self.user, reverse('posts:post_edit', args=[self.post.pk]),
+            'post', {'text': 'Изменённый пост'}
+        )
+        self.assertWithinBudget(
+            self.user, reverse('posts:post_edit', args=[self.post.pk]),
+            'post', {'text': 'Новая картинка', 'image': make_image('blue')}
+        )
+        self.assertWithinBudget(
+            self.user, reverse('posts:add_comment', args=[self.post.pk]),
+            'post', {'text': 'Новый комментарий'}
+        )
+        other = self.authors[1].username
+        self.assertWithinBudget(
+            self.user, reverse('posts:profile_unfollow', args=[other])
+        )
+        self.assertWithinBudget(
+            self.user, reverse('posts:profile_follow', args=[other])
+        )
+        self.assertWithinBudget(self.user, reverse('users:logout'))
+
+    def test_auth_actions(self):
+        self.assertWithinBudget(self.guest, reverse('users:login'), 'post', {
+            'username': self.author.username, 'password': PASSWORD
+        })
+        self.assertWithinBudget(
+            self.guest, reverse('users:password_change_form'), 'post', {
+                'old_password': PASSWORD,
+                'new_password1': 'Changed-pass-43',
+                'new_password2': 'Changed-pass-43',
+            }
+        )
+        self.assertWithinBudget(Client(), reverse('users:signup'), 'post', {
+            'first_name': 'Имя',
+            'last_name': 'Фамилия',
+            'username': 'newcomer',
+            'email': 'newcomer@yatube.ru',
+            'password1': PASSWORD,
+            'password2': PASSWORD,
+        })
+        self.assertWithinBudget(
+            self.guest, reverse('users:password_reset_form'), 'post',
+            {'email': self.author.email}
+        )
+        guest = Client()
+        response = self.assertWithinBudget(
+            guest, reverse('users:password_reset_confirm', args=[
+                urlsafe_base64_encode(force_bytes(self.authors[1].pk)),
+                default_token_generator.make_token(self.authors[1])
+            ])
+        )
+        self.assertWithinBudget(guest, response.url)
+
+    def test_media(self):
+        self.assertWithinBudget(self.guest, '/media/posts/00/missing.jpg')
+        self.assertWithinBudget(self.user, '/media/posts/00/missing.jpg')
+
+    def test_every_view_has_budget(self):
+        resolver = get_resolver()
+        for namespace in BUDGET_NAMESPACES:
+            _, namespace_resolver = resolver.namespace_dict[namespace]
+            for pattern in namespace_resolver.url_patterns:
+                if not isinstance(pattern, URLPattern):
+                    continue
+                with self.subTest(namespace=namespace, name=pattern.name):
+                    self.assertIsNotNone(get_query_budget(pattern.callback))
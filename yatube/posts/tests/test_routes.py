@@ -24,6 +24,7 @@ class PostsRoutesTests(TestCase):
             [f'/posts/{POST_ID}/edit/', 'post_edit', [POST_ID]],
             [f'/posts/{POST_ID}/edit/', 'post_edit', [POST_ID]],
             [f'/posts/{POST_ID}/comment/', 'add_comment', [POST_ID]],
+            [f'/posts/{POST_ID}/comments/', 'post_comments', [POST_ID]],
         ]
         for url, route, arg in templates_url_names:
             with self.subTest(url=url, route=route, arg=arg):
@@ -1,16 +1,24 @@
 # posts/tests/test_views.py
 
+import datetime
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Group, Post, User, Comment, Follow
-from ..settings import POSTS_PER_PAGE
+from .. import renditions
+from ..models import (Group, Post, User, Comment, Follow, TimelineEntry,
+                      UserStats)
+from ..settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 USERNAME = 'test_user'
 USERNAME_AUTH = 'test_auth_user'
@@ -34,7 +42,7 @@ PROFILE_UNFOLLOW_URL = reverse('posts:profile_unfollow', args=[USERNAME])
 PROFILE_AUTH_URL = reverse('posts:profile', args=[USERNAME_AUTH])
 PROFILE_AUTH_FOLLOW_URL = reverse('posts:profile_follow', args=[USERNAME_AUTH])
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 IMAGE_FILE_NAME = 'small1.gif'
 SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x01\x00'
@@ -45,7 +53,7 @@ SMALL_GIF = (
 )
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, RENDITION_WORKERS=0)
 class PostsViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -174,6 +182,82 @@ class PostsViewsTests(TestCase):
         self.assertFalse(Follow.objects.filter(user=self.user_auth,
                                                author=self.user).exists())
 
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок пополняется постами и очищается при отписке"""
+        new_post = Post.objects.create(text=POST_TEXT, author=self.user)
+        self.assertEqual(
+            list(self.another.get(FOLLOW_INDEX_URL).context['page_obj']),
+            [new_post, self.post]
+        )
+        self.another.get(PROFILE_UNFOLLOW_URL)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_auth).exists()
+        )
+        self.another.get(PROFILE_FOLLOW_URL)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_auth).count(),
+            Post.objects.filter(author=self.user).count()
+        )
+
+    def test_follow_feed_engines_agree(self):
+        """Все движки ленты подписок отдают одинаковые страницы"""
+        # bulk_create не шлёт сигналы, а лента заполняется по post_save.
+        for count in range(POSTS_PER_PAGE * 2):
+            Post.objects.create(text=f'{POST_TEXT}{count}', author=self.user)
+        pages = {}
+        for engine in ['join', 'timeline', 'merge']:
+            with self.subTest(engine=engine), override_settings(
+                    FOLLOW_FEED_ENGINE=engine), mock.patch(
+                    'posts.feeds.RECENT_POSTS_LIMIT', POSTS_PER_PAGE + 3):
+                cache.clear()
+                seen = []
+                cursor = ''
+                while True:
+                    page_obj = self.another.get(
+                        f'{FOLLOW_INDEX_URL}?cursor={cursor}'
+                    ).context['page_obj']
+                    seen.append([post.pk for post in page_obj])
+                    cursor = page_obj.paginator.next_cursor
+                    if not cursor:
+                        break
+                previous = self.another.get(
+                    f'{FOLLOW_INDEX_URL}?cursor='
+                    f'{page_obj.paginator.previous_cursor}'
+                ).context['page_obj']
+                seen.append([post.pk for post in previous])
+                pages[engine] = seen
+        self.assertEqual(pages['join'], pages['timeline'])
+        self.assertEqual(pages['join'], pages['merge'])
+        self.assertEqual(len(pages['join']), 4)
+
+    def test_profile_counters(self):
+        """Счётчики профиля следят за постами, комментариями и подписками"""
+        stats = self.another.get(PROFILE_URL).context['author'].stats
+        self.assertEqual(
+            (stats.posts_count, stats.comment_count,
+             stats.follower_count, stats.following_count),
+            (1, 1, 0, 1)
+        )
+        Comment.objects.create(post=self.post, author=self.user, text='x')
+        self.author.get(PROFILE_AUTH_FOLLOW_URL)
+        Post.objects.filter(pk=self.post.pk).delete()
+        stats = self.another.get(PROFILE_URL).context['author'].stats
+        self.assertEqual(
+            (stats.posts_count, stats.comment_count,
+             stats.follower_count, stats.following_count),
+            (0, 0, 1, 1)
+        )
+
+    def test_reconcile_user_stats_command(self):
+        """Команда сверки исправляет разошедшиеся счётчики"""
+        UserStats.objects.filter(user=self.user).update(posts_count=42)
+        UserStats.objects.filter(user=self.user_auth).delete()
+        call_command('reconcile_user_stats', stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.user_auth).follower_count, 1
+        )
+
     def test_author_cant_follow_yourself(self):
         """Автор не может подписаться на себя."""
         follow_count = Follow.objects.count()
@@ -214,10 +298,302 @@ class PostsViewsTests(TestCase):
                     expect
                 )
 
+    def test_cursor_pagination_walks_whole_feed(self):
+        """Курсорный паджинатор проходит ленту без пропусков и повторов"""
+        Post.objects.all().delete()
+        num_objects = POSTS_PER_PAGE * 2 + 3
+        Post.objects.bulk_create(
+            Post(text=f'{POST_TEXT}{count}', author=self.user)
+            for count in range(num_objects)
+        )
+        # Одинаковая дата создания: порядок держится на pk.
+        Post.objects.update(created=self.post.created)
+        expected = list(
+            Post.objects.order_by('-created', '-pk').values_list(
+                'pk', flat=True)
+        )
+        for url in [INDEX_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                seen = []
+                pages = []
+                address = url
+                while address:
+                    page_obj = self.guest.get(address).context['page_obj']
+                    pages.append(address)
+                    seen.extend(post.pk for post in page_obj)
+                    cursor = page_obj.paginator.next_cursor
+                    address = cursor and f'{url}?cursor={cursor}'
+                    cache.clear()
+                self.assertEqual(seen, expected)
+                self.assertEqual(len(pages), 3)
+                page_obj = self.guest.get(pages[-1]).context['page_obj']
+                previous = self.guest.get(
+                    f'{url}?cursor={page_obj.paginator.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in previous],
+                    expected[POSTS_PER_PAGE:POSTS_PER_PAGE * 2]
+                )
+                self.assertTrue(previous.has_previous())
+                self.assertTrue(previous.has_next())
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор отдаёт первую страницу ленты"""
+        page_obj = self.guest.get(
+            f'{INDEX_URL}?cursor=broken'
+        ).context['page_obj']
+        self.assertEqual(list(page_obj), [self.post])
+        self.assertFalse(page_obj.has_other_pages())
+
+    def test_feed_pages_do_not_depend_on_history_size(self):
+        """Профиль и группа читают только текущую страницу постов"""
+        queries = {}
+        for size in [0, POSTS_PER_PAGE * 3]:
+            Post.objects.bulk_create(
+                Post(text=f'{POST_TEXT}{count}', author=self.user,
+                     group=self.group)
+                for count in range(size)
+            )
+            for url in [PROFILE_URL, GROUP_LIST_URL]:
+                self.another.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    self.another.get(url)
+                queries.setdefault(url, []).append(len(context))
+        for url, counts in queries.items():
+            with self.subTest(url=url):
+                self.assertEqual(counts[0], counts[1])
+
     def test_cash_index_page(self):
         """Проверка кеширования главной страницы"""
         page_content = self.guest.get(INDEX_URL).content
-        Post.objects.all().delete()
+        # update() не шлёт сигналов: фрагмент остаётся в кеше.
+        Post.objects.update(text='Изменено в обход сигналов')
         self.assertEqual(page_content, self.guest.get(INDEX_URL).content)
         cache.clear()
         self.assertNotEqual(page_content, self.guest.get(INDEX_URL).content)
+
+    def test_index_cache_invalidated_on_change(self):
+        """Фрагмент главной сбрасывается сразу при изменении постов"""
+        page_content = self.guest.get(INDEX_URL).content
+        Post.objects.all().delete()
+        self.assertNotEqual(page_content, self.guest.get(INDEX_URL).content)
+        page_content = self.guest.get(INDEX_URL).content
+        Post.objects.create(text=POST_TEXT, author=self.user)
+        self.assertNotEqual(page_content, self.guest.get(INDEX_URL).content)
+
+    def test_cache_invalidated_when_renditions_stored(self):
+        """Копии, готовые после ответа, сразу видны в кешированных лентах"""
+        rendition = 'posts/renditions/stored_480x170.jpg'
+        self.assertNotIn(rendition, self.guest.get(INDEX_URL).content.decode())
+        self.assertNotIn(
+            rendition, self.another.get(FOLLOW_INDEX_URL).content.decode()
+        )
+        renditions.store(self.post.pk, self.post.image.name, [
+            {'file': rendition, 'width': 480, 'height': 170, 'format': 'jpeg'}
+        ])
+        self.assertIn(rendition, self.guest.get(INDEX_URL).content.decode())
+        self.assertIn(
+            rendition, self.another.get(FOLLOW_INDEX_URL).content.decode()
+        )
+
+    def test_follow_page_cache_per_user(self):
+        """Фрагмент ленты подписок свой у каждого читателя"""
+        follow_content = self.another.get(FOLLOW_INDEX_URL).content
+        self.assertIn(POST_TEXT, follow_content.decode())
+        self.assertNotIn(POST_TEXT, self.author.get(
+            FOLLOW_INDEX_URL).content.decode())
+        Post.objects.update(text='Изменено в обход сигналов')
+        self.assertEqual(
+            follow_content, self.another.get(FOLLOW_INDEX_URL).content
+        )
+
+    def test_follow_page_cache_invalidated(self):
+        """Лента подписок сбрасывается при новом посте и отписке"""
+        follow_content = self.another.get(FOLLOW_INDEX_URL).content
+        Post.objects.create(text='Новый пост автора', author=self.user)
+        new_content = self.another.get(FOLLOW_INDEX_URL).content
+        self.assertNotEqual(follow_content, new_content)
+        self.assertIn('Новый пост автора', new_content.decode())
+        self.another.get(PROFILE_UNFOLLOW_URL)
+        self.assertNotIn(
+            POST_TEXT,
+            self.another.get(FOLLOW_INDEX_URL).content.decode()
+        )
+
+    def test_anonymous_page_cache(self):
+        """Анонимы получают страницу из кеша до изменения контента"""
+        for url in [INDEX_URL, GROUP_LIST_URL, PROFILE_URL,
+                    self.POST_DETAIL_URL]:
+            with self.subTest(url=url):
+                content = self.guest.get(url).content
+                with self.assertNumQueries(0):
+                    response = self.guest.get(url)
+                self.assertEqual(response.content, content)
+                with CaptureQueriesContext(connection) as context:
+                    self.another.get(url)
+                self.assertTrue(context.captured_queries)
+        Comment.objects.create(post=self.post, author=self.user, text='x')
+        with CaptureQueriesContext(connection) as context:
+            self.guest.get(self.POST_DETAIL_URL)
+        self.assertTrue(context.captured_queries)
+
+    def test_conditional_get(self):
+        """Совпавший ETag даёт 304, изменение контента — новую страницу"""
+        for client, url in [
+            (self.guest, INDEX_URL),
+            (self.guest, GROUP_LIST_URL),
+            (self.guest, PROFILE_URL),
+            (self.guest, self.POST_DETAIL_URL),
+            (self.another, FOLLOW_INDEX_URL),
+        ]:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                etag = response['ETag']
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.content)
+                Comment.objects.create(
+                    post=self.post, author=self.user, text=COMMENT_TEXT
+                )
+                response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_follow_validators_skip_follow_join(self):
+        """ETag ленты подписок строится из данных движка без join с Follow"""
+        for engine in ('timeline', 'merge'):
+            with self.subTest(engine=engine), self.settings(
+                FOLLOW_FEED_ENGINE=engine
+            ):
+                etag = self.another.get(FOLLOW_INDEX_URL)['ETag']
+                with CaptureQueriesContext(connection) as context:
+                    response = self.another.get(FOLLOW_INDEX_URL,
+                                                HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                for query in context.captured_queries:
+                    self.assertFalse(
+                        'posts_follow' in query['sql']
+                        and 'posts_post' in query['sql'], query['sql']
+                    )
+                Post.objects.create(text=engine, author=self.user)
+                response = self.another.get(FOLLOW_INDEX_URL,
+                                            HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, engine)
+
+    def test_last_modified_follows_post_edit(self):
+        """Last-Modified страницы поста сдвигается при правке поста"""
+        response = self.another.get(self.POST_DETAIL_URL)
+        last_modified = response['Last-Modified']
+        self.assertEqual(
+            self.another.get(
+                self.POST_DETAIL_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+            ).status_code,
+            304
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            updated=self.post.updated + datetime.timedelta(days=1)
+        )
+        self.assertEqual(
+            self.another.get(
+                self.POST_DETAIL_URL, HTTP_IF_MODIFIED_SINCE=last_modified
+            ).status_code,
+            200
+        )
+
+    def test_comments_paged_without_n_plus_one(self):
+        """Комментарии грузятся порциями вместе с авторами"""
+        authors = [
+            User.objects.create_user(username=f'commentator{number}')
+            for number in range(3)
+        ]
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=authors[number % 3],
+                    text=f'{COMMENT_TEXT}{number}')
+            for number in range(COMMENTS_PER_PAGE * 2 + 5)
+        )
+        self.another.get(self.POST_DETAIL_URL)
+        with CaptureQueriesContext(connection) as few:
+            self.another.get(f'{self.POST_DETAIL_URL}?comments=')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=authors[number % 3],
+                    text=f'{COMMENT_TEXT}{number}')
+            for number in range(COMMENTS_PER_PAGE)
+        )
+        with CaptureQueriesContext(connection) as many:
+            response = self.another.get(self.POST_DETAIL_URL)
+        self.assertEqual(len(few), len(many))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        seen = [comment.pk for comment in comments]
+        cursor = comments.paginator.next_cursor
+        while cursor:
+            response = self.another.get(reverse(
+                'posts:post_comments', args=[self.post.pk]
+            ), {'cursor': cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            seen.extend(comment.pk for comment in response.context['comments'])
+            cursor = response.context['comments'].paginator.next_cursor
+        self.assertEqual(
+            seen,
+            list(self.post.comments.order_by('-created', '-pk').values_list(
+                'pk', flat=True))
+        )
+
+    def test_comments_count_maintained(self):
+        """Счётчик комментариев поста виден в ленте без лишних запросов"""
+        Comment.objects.create(post=self.post, author=self.user_auth,
+                               text=COMMENT_TEXT)
+        page_obj = self.another.get(INDEX_URL).context['page_obj']
+        self.assertEqual(page_obj[0].comments_count, 2)
+        self.assertContains(self.another.get(INDEX_URL), 'Комментариев: 2')
+        Comment.objects.filter(post=self.post).delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        post = self.another.get(self.POST_DETAIL_URL).context['post']
+        self.assertEqual(post.author.stats.posts_count, 1)
+
+    def test_cascade_delete_bumps_feed_once(self):
+        """Удаление поста с комментариями сбрасывает кэш лент один раз"""
+        commenter = User.objects.create_user(username='commenter')
+        other = Post.objects.create(author=self.user_auth, text=POST_TEXT)
+        for post in (self.post, self.post, other, other):
+            Comment.objects.create(post=post, author=commenter,
+                                   text=COMMENT_TEXT)
+        with mock.patch('posts.signals.bump_followers_versions') as bump:
+            Post.objects.get(pk=self.post.pk).delete()
+        bump.assert_called_once_with(self.user.pk)
+        with mock.patch('posts.signals.bump_followers_versions') as bump:
+            commenter.delete()
+        bump.assert_called_once_with(self.user_auth.pk)
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
+
+    def test_media_served_by_front_server(self):
+        """Картинку отдаёт фронтенд по заголовку, Django байты не читает."""
+        url = self.post.image.url
+        cases = {
+            'x-accel': ('X-Accel-Redirect',
+                        f'/protected-media/{self.post.image.name}'),
+            'x-sendfile': ('X-Sendfile', self.post.image.path),
+        }
+        for mode, (header, value) in cases.items():
+            with self.subTest(mode=mode), self.settings(
+                MEDIA_SERVE_MODE=mode
+            ):
+                response = self.guest.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response[header], value)
+                self.assertEqual(response['Content-Type'], 'image/gif')
+                self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SERVE_MODE='django'):
+            response = self.guest.get(url)
+            self.assertEqual(b''.join(response.streaming_content), SMALL_GIF)
+        self.assertEqual(
+            self.guest.get(f'{settings.MEDIA_URL}posts/unknown.gif')
+            .status_code,
+            404
+        )
+        with self.settings(MEDIA_LOGIN_REQUIRED=True):
+            self.assertEqual(self.guest.get(url).status_code, 403)
+            self.assertEqual(self.another.get(url).status_code, 200)
@@ -0,0 +1,37 @@
+"""Materialized follow timeline"""
+
+from .models import Follow, Post, TimelineEntry
+from .settings import TIMELINE_BATCH_SIZE
+
+
+def fan_out(post: Post) -> None:
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, created=post.created)
+         for user_id in followers.iterator()),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Добавляет в ленту читателя все посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'created'
+    )
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, created=created)
+         for pk, created in posts.iterator()),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def trim(user_id: int, author_id: int) -> None:
+    """Убирает из ленты читателя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
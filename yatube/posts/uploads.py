@@ -0,0 +1,146 @@
+"""Проверка и подготовка загружаемых картинок постов.
+
+Размер файла ограничивается ещё при чтении запроса, формат и размеры —
+по заголовку картинки, до декодирования пикселей. Декодируется картинка
+только один раз, при сохранении, и только если её нужно уменьшить или
+убрать из неё EXIF.
+"""
+
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.translation import gettext_lazy as _
+from PIL import Image, ImageOps
+
+from .settings import (IMAGE_FORMATS, IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS,
+                       IMAGE_MAX_SIDE, IMAGE_QUALITY, PLACEHOLDER_QUALITY,
+                       PLACEHOLDER_WIDTH, RENDITION_SIZE)
+
+EXIF_ORIENTATION = 0x0112
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, который не дочитали из-за размера: содержимого в нём нет."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Перестаёт принимать файл, как только он превысил IMAGE_MAX_BYTES.
+
+    Лишние байты не доходят до следующих обработчиков, то есть не пишутся
+    ни в память, ни на диск; вместо файла форма получает RejectedUpload.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limit = getattr(settings, 'IMAGE_MAX_BYTES', IMAGE_MAX_BYTES)
+        self.received = 0
+        self.rejected = (self.content_length is not None
+                         and self.content_length > self.limit)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limit:
+            self.rejected = True
+        return None if self.rejected else raw_data
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(self.file_name, self.content_type,
+                                  self.received)
+        return None
+
+
+def too_large_error() -> ValidationError:
+    return ValidationError(
+        _('Файл больше %(limit)s МБ'),
+        code='file_too_large',
+        params={'limit': getattr(settings, 'IMAGE_MAX_BYTES',
+                                 IMAGE_MAX_BYTES) // (1024 * 1024)},
+    )
+
+
+def validate_image(upload) -> None:
+    """Проверяет размер файла, формат и число пикселей по заголовку.
+
+    ``upload.image`` — картинка, которую ImageField открыл без декодирования.
+    """
+    if upload.size > getattr(settings, 'IMAGE_MAX_BYTES', IMAGE_MAX_BYTES):
+        raise too_large_error()
+    image = upload.image
+    if image.format not in getattr(settings, 'IMAGE_FORMATS',
+                                   IMAGE_FORMATS):
+        raise ValidationError(
+            _('Формат %(format)s не поддерживается'),
+            code='unsupported_format',
+            params={'format': image.format},
+        )
+    width, height = image.size
+    if width * height > getattr(settings, 'IMAGE_MAX_PIXELS',
+                                IMAGE_MAX_PIXELS):
+        raise ValidationError(
+            _('Картинка %(width)s×%(height)s слишком большая'),
+            code='too_many_pixels',
+            params={'width': width, 'height': height},
+        )
+
+
+def normalize_image(upload):
+    """Уменьшает слишком большой оригинал и убирает из него EXIF.
+
+    JPEG декодируется через ``draft()`` сразу в уменьшенном масштабе,
+    поворот из EXIF применяется к пикселям. Картинки, которым ничего не
+    нужно, и анимации возвращаются как есть, без перекодирования.
+    """
+    max_side = getattr(settings, 'IMAGE_MAX_SIDE', IMAGE_MAX_SIDE)
+    upload.seek(0)
+    image = Image.open(upload)
+    too_big = max(image.size) > max_side
+    if getattr(image, 'is_animated', False) or not (
+        too_big or 'exif' in image.info
+    ):
+        upload.seek(0)
+        return upload
+    image_format = image.format
+    if image_format == 'JPEG':
+        image.draft(image.mode, (max_side, max_side))
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if too_big:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    for key in ('exif', 'xmp', 'XML:com.adobe.xmp'):
+        image.info.pop(key, None)
+    buffer = BytesIO()
+    image.save(buffer, image_format,
+               quality=getattr(settings, 'IMAGE_QUALITY', IMAGE_QUALITY),
+               icc_profile=image.info.get('icc_profile'))
+    return SimpleUploadedFile(upload.name, buffer.getvalue(),
+                              upload.content_type)
+
+
+def describe_image(upload) -> tuple:
+    """Возвращает ширину, высоту и заглушку картинки в виде data URI.
+
+    Заглушка вырезана в кадре ``RENDITION_SIZE``, чтобы занять место
+    копии; JPEG ради неё декодируется через ``draft()`` в малом масштабе.
+    """
+    base_width, base_height = RENDITION_SIZE
+    size = (PLACEHOLDER_WIDTH,
+            max(1, round(PLACEHOLDER_WIDTH * base_height / base_width)))
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    image.draft('RGB', size)
+    placeholder = ImageOps.fit(image.convert('RGB'), size, Image.BILINEAR)
+    buffer = BytesIO()
+    placeholder.save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    upload.seek(0)
+    return width, height, 'data:image/jpeg;base64,{}'.format(
+        base64.b64encode(buffer.getvalue()).decode()
+    )
@@ -1,77 +1,136 @@
 """Posts views configuration"""
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
 from django.core.handlers.wsgi import WSGIRequest
-from django.core.paginator import Paginator
-from django.db.models import Count
+from django.core.paginator import Page, Paginator
 from django.db.models.query import QuerySet
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
 
+from core.decorators import cache_anonymous, query_budget
+from core.media import sendfile
+from core.paginator import CursorPaginator
 
+from . import renditions
+from .cache import content_version, feed_version, follow_version
+from .conditional import (conditional, follow_validators, group_validators,
+                          index_validators, post_detail_validators,
+                          profile_validators)
+from .feeds import FOLLOW_FEED_PAGINATORS
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
-from .settings import POSTS_PER_PAGE
+from .models import Post, Group, User, Follow, Comment
+from .settings import (ANONYMOUS_PAGE_TIMEOUT, COMMENTS_PER_PAGE,
+                       FOLLOW_FEED_ENGINE, POSTS_PER_PAGE)
+from .stats import get_stats
+from .storage import is_referenced
 
 
 def get_paginator_page(request: WSGIRequest, object_list: QuerySet,
-                       per_page: int = POSTS_PER_PAGE) -> Paginator:
-    return Paginator(object_list, per_page).get_page(request.GET.get('page'))
-
-
+                       per_page: int = POSTS_PER_PAGE,
+                       paginator_class=CursorPaginator, **kwargs) -> Page:
+    """Страница ленты по курсору; ``?page=N`` оставлен для старых ссылок."""
+    if 'page' in request.GET and 'cursor' not in request.GET:
+        return Paginator(object_list, per_page).get_page(
+            request.GET.get('page')
+        )
+    return paginator_class(object_list, per_page,
+                           cursor=request.GET.get('cursor'),
+                           **kwargs).cursor_page()
+
+
+def get_comments_page(post_id: int, cursor: str) -> Page:
+    """Порция комментариев с авторами одним запросом по курсору."""
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENTS_PER_PAGE,
+        cursor=cursor
+    ).cursor_page()
+
+
+@query_budget(5)
+@cache_anonymous(content_version, ANONYMOUS_PAGE_TIMEOUT)
+@conditional(index_validators)
 def index(request):
     return render(request, 'posts/index.html', {
+        'feed_version': feed_version(),
         'page_obj': get_paginator_page(
             request,
-            Post.objects.select_related('author').select_related('group')
+            Post.objects.select_related('author').select_related(
+                'group').prefetch_related('renditions')
         ),
     })
 
 
+@query_budget(6)
+@cache_anonymous(content_version, ANONYMOUS_PAGE_TIMEOUT)
+@conditional(group_validators)
 def group_posts(request, slug):
-    group = get_object_or_404(
-        Group.objects.prefetch_related('posts__author'),
-        slug=slug
-    )
+    group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': get_paginator_page(request, group.posts.all()),
+        'page_obj': get_paginator_page(
+            request,
+            group.posts.select_related('author').select_related(
+                'group').prefetch_related('renditions')
+        ),
     })
 
 
+@query_budget(7)
+@cache_anonymous(content_version, ANONYMOUS_PAGE_TIMEOUT)
+@conditional(profile_validators)
 def profile(request, username):
     author = get_object_or_404(
-        User.objects.annotate(
-            posts_count=Count('posts', distinct=True),
-            comment_count=Count('comments', distinct=True),
-            following_count=Count('following', distinct=True),
-            follower_count=Count('follower', distinct=True)
-        ).prefetch_related('posts__group'),
+        User.objects.select_related('stats'),
         username=username
     )
+    author.stats = get_stats(author)
     following = (request.user.is_authenticated
                  and request.user != author
                  and Follow.objects.filter(user=request.user,
                                            author=author).exists())
     return render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': get_paginator_page(request, author.posts.all()),
+        'page_obj': get_paginator_page(
+            request,
+            author.posts.select_related('author').select_related(
+                'group').prefetch_related('renditions')
+        ),
         'following': following
     })
 
 
+@query_budget(6)
+@cache_anonymous(content_version, ANONYMOUS_PAGE_TIMEOUT)
+@conditional(post_detail_validators)
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('author').annotate(posts_count=Count(
-            'author__posts')).select_related('group').prefetch_related(
-            'comments'),
+        Post.objects.select_related('author__stats').select_related(
+            'group').prefetch_related('renditions'),
         pk=post_id
     )
+    post.author.stats = get_stats(post.author)
     return render(request, 'posts/post_detail.html', {
         'post': post,
+        'comments': get_comments_page(post.pk, request.GET.get('comments')),
         'form': CommentForm()
     })
 
 
+@query_budget(4)
+@cache_anonymous(content_version, ANONYMOUS_PAGE_TIMEOUT)
+def post_comments(request, post_id):
+    """Фрагмент со следующей порцией комментариев поста."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': get_comments_page(post_id, request.GET.get('cursor')),
+    })
+
+
+@query_budget(12)
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -80,9 +139,11 @@ def post_create(request):
     new_post = form.save(commit=False)
     new_post.author = request.user
     new_post.save()
+    renditions.schedule(new_post)
     return redirect('posts:profile', request.user.username)
 
 
+@query_budget(10)
 @login_required
 def post_edit(request, post_id):
     query_post = Post.objects.select_related('author').select_related('group')
@@ -98,9 +159,12 @@ def post_edit(request, post_id):
         context = {'form': form, 'is_edit': True}
         return render(request, 'posts/create_post.html', context)
     form.save()
+    if 'image' in form.changed_data:
+        renditions.schedule(post)
     return redirect('posts:post_detail', post_id)
 
 
+@query_budget(7)
 @login_required
 def add_comment(request, post_id):
     post = get_object_or_404(Post.objects.select_related('author'), pk=post_id)
@@ -113,17 +177,25 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(5)
 @login_required
+@conditional(follow_validators)
 def follow_index(request):
+    engine = getattr(settings, 'FOLLOW_FEED_ENGINE', FOLLOW_FEED_ENGINE)
     return render(request, 'posts/follow.html', {
+        'follow_version': follow_version(request.user.pk),
         'page_obj': get_paginator_page(
             request,
             Post.objects.select_related('author').select_related(
-                'group').filter(author__following__user=request.user)
+                'group').prefetch_related('renditions').filter(
+                author__following__user=request.user),
+            paginator_class=FOLLOW_FEED_PAGINATORS[engine],
+            user=request.user
         ),
     })
 
 
+@query_budget(9)
 @login_required
 def profile_follow(request, username):
     if request.user.username != username:
@@ -135,9 +207,21 @@ def profile_follow(request, username):
     return redirect('posts:profile', username=username)
 
 
+@query_budget(7)
 @login_required
 def profile_unfollow(request, username):
     get_object_or_404(Follow,
                       user=request.user,
                       author__username=username).delete()
     return redirect('posts:profile', username=username)
+
+
+@query_budget(4)
+def media(request, name):
+    """Картинки постов: проверки в Django, передача байтов — фронтенду."""
+    if (getattr(settings, 'MEDIA_LOGIN_REQUIRED', False)
+            and not request.user.is_authenticated):
+        raise PermissionDenied
+    if not is_referenced(name):
+        raise Http404
+    return sendfile(request, Post.image.field.storage, name)
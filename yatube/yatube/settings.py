@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 import sentry_sdk
 from dotenv import load_dotenv
@@ -29,7 +30,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = False
+# DJANGO_DEBUG=1 включает отладку и debug_toolbar для локальной работы.
+DEBUG = os.getenv('DJANGO_DEBUG') == '1'
 
 ALLOWED_HOSTS = [
     '127.0.0.1',
@@ -53,7 +55,6 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'django_extensions',
     'sorl.thumbnail',
     'posts.apps.PostsConfig',
@@ -63,6 +64,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -71,14 +75,26 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.ProfilerMiddleware',
 ]
 
+# Django Debug Toolbar только для разработки: в бою он лишь замедляет
+# каждый запрос, а для разбора запросов есть ProfilerMiddleware.
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 # For Django Debug Toolbar
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# Профили запросов (?_profile=1 или X-Profile: 1 от персонала).
+PROFILE_DIR = os.getenv('PROFILE_DIR',
+                        os.path.join(tempfile.gettempdir(), 'yatube-profiles'))
+
+PROFILE_KEEP = 50
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -170,6 +186,26 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Как /media/ отдаёт файлы: django (разработка), x-accel (nginx) или
+# x-sendfile (Apache). Для x-accel в nginx нужен internal location:
+#   location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE',
+                             'django' if DEBUG else 'x-accel')
+
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+MEDIA_LOGIN_REQUIRED = False
+
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Копии картинок постов строятся пулом процессов вне запроса;
+# 0 — прямо в запросе (удобно для отладки).
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', 2))
+
 
 LOGIN_URL = 'users:login'
 
@@ -191,6 +227,56 @@ CACHES = {
     }
 }
 
+# Server-Timing в ответах видят персонал и DEBUG; True — видят все.
+SERVER_TIMING_PUBLIC = False
+
+# Каталог для файлов метрик воркеров; без него /metrics видит только
+# свой процесс. Каталог стоит очищать при перезапуске сервиса.
+METRICS_DIR = os.getenv('METRICS_DIR')
+
+# Токен для сборщика: Authorization: Bearer <METRICS_TOKEN>.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Порог журнала медленных SQL в миллисекундах; None — журнал выключен.
+SLOW_QUERY_THRESHOLD_MS = (float(os.getenv('SLOW_QUERY_THRESHOLD_MS'))
+                           if os.getenv('SLOW_QUERY_THRESHOLD_MS') else None)
+
+SLOW_QUERY_LOG_SIZE = 500
+
+# Значения параметров медленных SQL (в них бывают хеши паролей, ключи
+# сессий и токены); по умолчанию пишутся только их типы.
+SLOW_QUERY_LOG_PARAMS = os.getenv('SLOW_QUERY_LOG_PARAMS') == '1'
+
+# Проверка бюджетов SQL из @query_budget: 'log', 'raise' или None (выкл.).
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE') or None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Строка с таймингами на каждый запрос; TIMING_LOG_LEVEL=WARNING
+        # выключает её (например, при прогоне тестов).
+        'core.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'core.slow_sql': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.query_budget': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 sentry_sdk.init(
     dsn=os.getenv('DSN_KEY'),
     integrations=[DjangoIntegration()],
@@ -1,10 +1,15 @@
 """yatube URL Configuration"""
 
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from core.views import metrics, profile_download
+from posts.views import media
 
 
 urlpatterns = [
@@ -12,7 +17,11 @@ urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics/', metrics, name='metrics'),
+    path('profiles/<str:name>', profile_download, name='profile_download'),
     path('', include('posts.urls', namespace='posts')),
+    re_path(r'^{}(?P<name>.+)$'.format(re.escape(settings.MEDIA_URL[1:])),
+            media, name='media'),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 handler403 = 'core.views.permission_denied'
@@ -24,6 +33,3 @@ if settings.DEBUG:
 
     urlpatterns += (path('__debug__/', include(debug_toolbar.urls)),)
     urlpatterns += staticfiles_urlpatterns()
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )